@@ -33,9 +33,10 @@
 # In[1]:
 
 
-import os,geopandas, folium,datetime
-import branca # for a colorscale
+import os,datetime
 import pandas as pd
+from covid_metrics import states, runlog
+# each stage's wall time, CPU time and peak RSS go to runlog.jsonl, see python -m covid_metrics.runlog summary
 
 
 # In[2]:
@@ -43,12 +44,9 @@ import pandas as pd
 
 # Downloaded state data from https://github.com/python-visualization/folium/blob/master/examples/data/us-states.json
 
-state_json=os.path.join('/Users/drf/Downloads/', 'us-states.json')
-
-if not os.path.exists(state_json):
-    get_ipython().system(' wget -O "$state_json" https://github.com/python-visualization/folium/blob/master/examples/data/us-states.json')
-
-state = geopandas.read_file(state_json)
+state_json=states.STATE_JSON
+with runlog.span('state_geometry'):
+    state = states.load_geometry(state_json)  # downloads it if missing
 
 
 # In[3]:
@@ -56,23 +54,16 @@ state = geopandas.read_file(state_json)
 
 # #downloaded population data from Census https://www2.census.gov/programs-surveys/popest/datasets/2010-2019/state/detail/
 # or https://www2.census.gov/programs-surveys/popest/datasets/2010-2019/state/detail/SCPRC-EST2019-18+POP-RES.csv
-census_pop_state_file=os.path.join('/Users/drf/Downloads/', 'SCPRC-EST2019-18+POP-RES.csv')
-
-if not os.path.exists(census_pop_state_file):
-    get_ipython().system(' wget -O "$census_pop_state_file" https://www2.census.gov/programs-surveys/popest/datasets/2010-2019/state/detail/SCPRC-EST2019-18+POP-RES.csv')
-
-pops = pd.read_csv(census_pop_state_file)
-#display(pops)
+census_pop_state_file=states.CENSUS_POP_STATE_FILE
 
 
 # In[4]:
 
 
-# map 2-letter codes to population data using https://github.com/drf5n/fips-codes/blob/patch-1/state_fips_master.csv modded from 
-# https://github.com/kjhealy/fips-codes/blob/master/state_fips_master.csv
-statemaster = pd.read_csv('https://raw.githubusercontent.com/drf5n/fips-codes/patch-1/state_fips_master.csv')
-pop_augment = pops.set_index('STATE').join(statemaster.set_index('state')['state_abbr']).reset_index()
-display(pop_augment)
+# 2-letter codes from population.STATE_ABBR, as in https://github.com/kjhealy/fips-codes/blob/master/state_fips_master.csv
+with runlog.span('state_population'):
+    pop_augment = states.load_population()
+print(pop_augment)
 
 
 # In[5]:
@@ -93,15 +84,15 @@ if state_source == "CovidTracking":
 # This new schema is a bit different
 
     #covids["date"] = pd.to_datetime(covids['date'])
-    display(covids)
+    print(covids)
     df = covids.sort_values(by=['state', 'date'])
-    display(df)
+    print(df)
     
     lastdate = int(covids.tail(1).date) # last day in file
     #doi = lastdate # (bad as updates happen)
     doi = int((datetime.datetime.now()-datetime.timedelta(days = 1)
          ).strftime("%Y%m%d"))  # yesterday morning as an int
-    display(doi)
+    print(doi)
 
     df['TC_diff']= df.groupby('state')['positive'].diff().fillna(0) 
     df['TC_sum14']= df.groupby('state')['positive'].diff(14).fillna(0)
@@ -109,25 +100,25 @@ if state_source == "CovidTracking":
     dfy = df[df['date']==doi].copy()
 
 elif  state_source == "CDC":
-    # 4 day lag seems to work
-    url = 'https://beta.healthdata.gov/api/views/j8mb-icvb/rows.csv?accessType=DOWNLOAD&api_foundry=true'
-    print(f"State COVID Data from {state_source}: {url}")
-    #covids = pd.read_json('https://beta.healthdata.gov/resource/j8mb-icvb.json')
-    covids = pd.read_csv(url)
-    covids["date"] = pd.to_datetime(covids['date'])
-    lastdate = covids.tail(1).date # last day in file
-    df = covids[covids["overall_outcome"]=="Positive"].sort_values(by=['state', 'date'])
-    doi = (datetime.datetime.now()-datetime.timedelta(days = 5)
-         ).strftime("%Y%m%d")  # yesterday morning as an int
-    display(doi, lastdate)
-    df['TC_diff']= df.groupby('state')['total_results_reported'].diff().fillna(0) 
-    df['TC_sum7']= df.groupby('state')['total_results_reported'].diff(7).fillna(0)
-    df['TC_sum14']= df.groupby('state')['total_results_reported'].diff(14).fillna(0)
-    df['TC_sum28']= df.groupby('state')['total_results_reported'].diff(28).fillna(0)
-    dfy = df[df['date']==doi].copy()
+    print(f"State COVID Data from {state_source}: {states.CDC_URL}")
+    with runlog.span('state_download'):
+        states.download()  # a 304 if the CDC file hasn't changed
+    with runlog.span('state_cases'):
+        df = states.load_cases()
+    lastdate = df.tail(1).date # last day in file
+    # 1, 7, 14 and 28 day sums for every state and day in one pass
+    with runlog.span('state_windows'):
+        cw = states.state_windows(df)
+    # keep each date as published; map the latest one every state is in, not a fixed lag
+    snaps = states.snapshots_store()
+    with runlog.span('snapshots'):
+        snaps.update(df, cw)
+    doi = states.default_day(snaps)
+    print(doi, lastdate)
+    dfy = cw.on(doi)
 
     
-    display(dfy)
+    print(dfy)
 else:
     print(f"No state daily data for {state_source}")
 
@@ -146,42 +137,17 @@ df.groupby(['date'])['state'].count()
 # In[7]:
 
 
+with runlog.span('state_metrics'):
+    dfya = states.state_metrics(df, cw, pop_augment, doi)
 
-display("DFY:",dfy)
-
-dfya = dfy.set_index('state').join(pop_augment.set_index('state_abbr'),lsuffix='lj').reset_index()
+print(dfya[['state','date','per100k_1daysum','per100k_7daysum', 'per100k_28daysum']])
 
-dfya['per100k_14daysum']=dfya['TC_sum14']*100000/dfya['POPESTIMATE2019']
-dfya['per100k_28daysum']=dfya['TC_sum28']*100000/dfya['POPESTIMATE2019']
-dfya['per100k_7daysum']=dfya['TC_sum7']*100000/dfya['POPESTIMATE2019']
-dfya['per100k_1daysum']=dfya['TC_diff']*100000/dfya['POPESTIMATE2019']
-display(dfya.columns)
+print(dfya.head())
 
-display(dfya[['state','date','per100k_1daysum','per100k_14daysum', 'per100k_28daysum']])
-
-dfya['foreign']= pd.cut(dfya['per100k_28daysum'],
-                       bins=[-1,50,100,500,50000],
-                       labels=['Level 1, Low:  All travelers should wear a mask, stay at least 6 feet from people who are not from your household, wash your hands often or use hand sanitizer, and watch your health for signs of illness.',
-                                'Level 2, Moderate: Travelers at increased risk for severe illness from COVID-19 should avoid all nonessential travel.',
-                                'Level 3, High: Travelers should avoid all nonessential travel',
-                                'Level 4, Very High: Travelers should avoid all travel',
-                              ]).astype(str)
-dfya['school']= pd.cut(dfya['per100k_7daysum'],
-                       bins=[-1,10,50,100,50000],
-                       labels=[
-                                'Lower risk of transmission',
-                                'Moderate risk of transmission',
-                                'Higher risk of transmission',
-                                'Highest risk of transmission',
-                              ]).astype(str)
-
-
-display(dfya.head())
-
-file_state_covid='USCovidStates.geojson'
-gjson = state.set_index('id').join(dfya[['state','date','new_results_reported','POPESTIMATE2019','per100k_1daysum','per100k_7daysum', 'per100k_28daysum','foreign','school']].set_index('state'))
-gjson.to_file(file_state_covid, driver='GeoJSON')
-display(gjson.head())
+file_state_covid=states.GEOJSON_FILE
+with runlog.span('state_join'):
+    gjson = states.join_geometry(state, dfya, file_state_covid)
+print(gjson.head())
 
 
 # In[8]:
@@ -189,86 +155,20 @@ display(gjson.head())
 
 #Make some colorscales
 
-# branca color names are defined in https://raw.githubusercontent.com/python-visualization/branca/master/branca/_cnames.json
-
-colorscale = branca.colormap.linear.YlOrRd_09.scale(0, 200)
-colorscale = branca.colormap.linear.YlOrRd_09.to_step(index=[0,50, 100,500, 1000])
-
-# Foreign 50,100,500
-colorscale_28 = branca.colormap.StepColormap(
-    ['yellow','orange','darkorange','red','red','#440000'], 
-    index=[0,50,100,500,1000,3000], caption='New Cases/28days/100k (red > 500, Very High)',vmin=0, vmax=3000,
-)
-
-# Foreign 50,100,500
-colorscale_28l = branca.colormap.StepColormap(
-    ['yellow','orange','darkorange','red','red','#440000'], 
-    index=[0,50,100,500,510,3000], caption='New Cases/28days/100k',vmin=0, vmax=3000,
-).to_linear()
-colorscale_28l.caption=colorscale_28.caption
-
-# Foreign 50,100,500 -- Nobody;s using 14 days anymore
-colorscale_14 = branca.colormap.StepColormap(
-    ['blue','green','yellow','orange','red','darkred','red','black'], 
-    index=[0,10,50,100,500,501,1000,5000], caption='New Cases/14days/100k',vmin=0, vmax=400,
-)
-
 # Foreign 50,100,500
-colorscale_1 = branca.colormap.StepColormap(
-    ['blue','green','yellow','orange','red','red','red','black'], 
-    index=[0,5,20,50,500,501,1000,5000], caption='New Cases/28days/100k',vmin=0, vmax=400,
-)
-
-
-display(colorscale_28)
-display(colorscale_28l)
-
+colorscale_28l = states.colorscale()
 
+print(colorscale_28l)
 
 
 # In[9]:
 
 
 # Make a map out of it:
-m = folium.Map(location=[37.9, -90], zoom_start=4)
-
-
-loc = f"""{doi} US States COVID risk per CDC <a href="https://www.cdc.gov/coronavirus/2019-ncov/travelers/map-and-travel-notices.html">Foreign Travel</a> 
-      and <a href="https://www.cdc.gov/coronavirus/2019-ncov/community/schools-childcare/k-12-guidance.html">School/Community</a> Risk Categories</a>"""
-subt = """(Red is CDC Level 4: >500cases/28days/100k, Very High, Avoid all travel" and Black is 10x higher)"""
-title_html = '''
-             <h3 align="center" style="font-size:16px"><b>{}</b></h3>
-             <h4 align="center" style="font-size:12px"><b>{}</b></h4>
-
-             <a href="https://github.com/drf5n/YCSD_covid_metrics">(source code)</a>
-             '''.format(loc,subt)   
-
-
-display(gjson.columns)
-
-def style_function_28(feature):
-    y=feature['properties']['per100k_28daysum']
-   # print(feature)
-    return {
-        'fillOpacity': 0.5,
-        'weight': 0,
-        'fillColor': '#black' if y is None else colorscale_28l(y)
-    }
-
-folium.GeoJson(
-    file_state_covid,
-    name='geojson',
-    style_function=style_function_28,
-    highlight_function=lambda x: {'weight': 2, 'color':'black', 'fillOpacity': 0.4,},
-    tooltip=folium.features.GeoJsonTooltip(
-        fields=['name',"date",'per100k_28daysum','per100k_7daysum',"POPESTIMATE2019",'foreign','school'],
-        aliases=['State','Date','Cases/28d/100kpop','Cases/7d/100kpop','2019 Population','CDC Foreign Travel Rec.','CDC Community'],),
-    
-).add_to(m)
-m.add_child(colorscale_28l)
-m.get_root().html.add_child(folium.Element(title_html))
-
-m.save('docs/us_covid_states_map.html')
+with runlog.span('state_map'):
+    print(states.save_map(doi, file_state_covid))
+# the saved page loads its outlines and data from docs/assets; this one has them inline
+m = states.make_map(file_state_covid, doi)
 m
 
 
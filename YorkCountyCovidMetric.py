@@ -20,69 +20,41 @@
 # %matplotlib widget
 import os,sys,io, time, datetime, pathlib
 import pandas as pd
+from covid_metrics import vdh, windows, locality, render, runlog
+# each stage's wall time, CPU time and peak RSS go to runlog.jsonl, see python -m covid_metrics.runlog summary
 #import numpy as np, matplotlib as mpl, matplotlib.pyplot as plt
 
-import bokeh.plotting
-import bokeh.io
-import bokeh.models
-from bokeh.io import output_notebook
-bokeh.io.output_notebook()
-
-
-# In[2]:
-
-
-def file_age(filepath):
-    return time.time() - os.path.getmtime(filepath)
-
-
-# In[3]:
-
-
-#os.getcwd()
-#!wget -O $df_name 'https://data.virginia.gov/api/views/bre9-aqqr/rows.csv?accessType=DOWNLOAD'
-#! pwd ; ls
-
 
 # In[4]:
 
 
 # get the Virginia COVID Case data from https://data.virginia.gov/Government/VDH-COVID-19-PublicUseDataset-Cases/bre9-aqqr
 
-df_name = "VA_vdh_casedata.csv"
-
-df=pd.read_csv(df_name)
-#display(datetime.datetime.now() - pd.to_datetime(df['Report Date'].iloc[-1])   )
-#display(datetime.datetime.now() - pd.to_datetime(df['Report Date'].iloc[-1])  > datetime.timedelta(days=1) )
+df_name = vdh.CSV_NAME
 
-#if 1 or file_age(df_name) > 86400/2:
-if 1 or not os.path.exists(df_name) or (datetime.datetime.now() - pd.to_datetime(df['Report Date'].iloc[-1])  > datetime.timedelta(days=1)) :
-    get_ipython().system("wget -O $df_name 'https://data.virginia.gov/api/views/bre9-aqqr/rows.csv?accessType=DOWNLOAD'")
-    get_ipython().system(' pwd ; ls')
-    pathlib.Path(df_name).touch()
-df=pd.read_csv(df_name)
-df["date"] = pd.to_datetime(df['Report Date'])
+# the Parquet history cache (VA_vdh_casedata.parquet) only appends the new report dates from the CSV
+with runlog.span('vdh_download'):
+    vdh.download(df_name)
+with runlog.span('vdh_load'):
+    df=vdh.load_cases(df_name)
 last_date = df['date'].iloc[-1]
 
 if ((datetime.datetime.now() - last_date).days  >= 1) :
-    display(f"{df_name} is still old with {last_date} versus {datetime.datetime.now()}")
+    print(f"{df_name} is still old with {last_date} versus {datetime.datetime.now()}")
 else:
-    display(f"{df_name} is up to date at {last_date} versus {datetime.datetime.now()}")
+    print(f"{df_name} is up to date at {last_date} versus {datetime.datetime.now()}")
 
 
 # In[5]:
 
 
+# pivot Total Cases into a FIPS x calendar day array once; the 1, 7, 14 and 28 day sums
+# for every locality come out of the same pass
+with runlog.span('windows'):
+    cw = windows.CaseWindows.from_frame(df, key='FIPS')
 
-df = df.sort_values(by=['Locality', 'date'])
-
-df['TC_diff']= df.groupby('Locality')['Total Cases'].diff().fillna(0)
-df['TC_sum14']= df.groupby('Locality')['Total Cases'].diff(14).fillna(0)
-df['TC_sum7']= df.groupby('Locality')['Total Cases'].diff(7).fillna(0)
-df['TC_sum28']= df.groupby('Locality')['Total Cases'].diff(28).fillna(0)
-
-display(df.head())
-display(df.tail())
+print(cw.frame().head())
+print(cw.frame().tail())
 
 
 # In[6]:
@@ -91,17 +63,10 @@ display(df.tail())
 # Read VDH population data donwloaded from https://apps.vdh.virginia.gov/HealthStats/stats.htm 
 # and https://apps.vdh.virginia.gov/HealthStats/documents/xls/2018%20Pop.xls 
 
-pop_file = '/Users/drf/Downloads/2018 Pop.xls'
-if not os.path.exists(pop_file):
-    get_ipython().system(' wget -O "$pop_name" https://apps.vdh.virginia.gov/HealthStats/documents/xls/2018%20Pop.xls')
-
-popxls=pd.read_excel('/Users/drf/Downloads/2018 Pop.xls',header=[3])
-popxls['FIPS']=51000+(popxls.loc[:,'Code'].fillna(0)).astype(int)  # eliminate NaNs above?
-#display(popxls[popxls['Code']==199]['Population'])
-#display(popxls['Locality'].str.match('York County').fillna(False))
-display(popxls[popxls['Locality'].str.match('York County').fillna(False)])
-display(popxls[popxls['Locality'].str.contains('Virginia Beach').fillna(False)])
-#display("City:",popxls[popxls['Locality'].str.contains('City').fillna(False)])
+pop_file = locality.POP_XLS
+with runlog.span('population'):
+    popxls=locality.load_population()  # from the population index, downloading pop_file if missing
+print(popxls[popxls['FIPS'].isin([51199, 51810])])  # York County, Virginia Beach
 
 
 # In[7]:
@@ -110,22 +75,11 @@ display(popxls[popxls['Locality'].str.contains('Virginia Beach').fillna(False)])
 # subset for York and normalize per capita
 loi='York'
 
-VDH_pop = int(popxls[popxls['Locality'].str.match('York').fillna(False)]['Population'])
-display("VDH_pop: ",VDH_pop)
-
-
-dfy = df[df['Locality']=='York'].copy()
-dfy['per100k_14daysum']=dfy['TC_sum14']*100000/VDH_pop
-dfy['per100k_7daysum']=dfy['TC_sum7']*100000/VDH_pop
-
-
-dfy['per100k_1daymean']=dfy['TC_diff']*100000/VDH_pop
-dfy['per100k_7daymean']=dfy['TC_sum7']*100000/VDH_pop/7
-dfy['per100k_14daymean']=dfy['TC_sum14']*100000/VDH_pop/14
-dfy['per100k_28daymean']=dfy['TC_sum28']*100000/VDH_pop/28
-
-
+VDH_pop = locality.locality_population(popxls, loi, df)
+print("VDH_pop: ",VDH_pop)
 
+with runlog.span('locality_series'):
+    dfy = locality.locality_series(df, cw, loi, VDH_pop)
 
 
 # for VB:
@@ -133,8 +87,7 @@ dfy['per100k_28daymean']=dfy['TC_sum28']*100000/VDH_pop/28
 if 0:
     loi='Virginia Beach'
 
-    dfy = df[df['Locality']=='Virginia Beach'].copy()
-    dfy['per100k_14daysum']=dfy['TC_sum14']*100000/450189  
+    dfy = locality.locality_series(df, cw, loi, 450189)
 
 
 # In[8]:
@@ -143,110 +96,11 @@ if 0:
 dfy.tail(30)
 
 
-# In[9]:
-
-
-ph = dfy.plot(y='per100k_7daysum',x='date',title="York County Number of new cases per 100,000 persons \nwithin the last 7 days")
-
-ph
-
-
-# In[10]:
-
-
-ph = dfy.plot(y='TC_diff',x='date',title="York County Cases, daily cases, per 100K")
-ph
-
-
 # In[11]:
 
 
-TOOLTIPS = [
- #   ("index", "$index"),
- #   ("date:", "$x{%F %T}"),
-    ("date:", "@date{%F}"),
-    ("cases/7d/100k:","@per100k_7daysum"),
-    ("cases/14d/100k:","@per100k_14daysum"),
- #   ("(x,y)", "($x, $y)"),
-]
-
-vmax = (int(dfy['per100k_7daysum'].max() / 40 )+2)*40 # 
-
-#bokeh.plotting.output_file('docs/YorkCountyCovidMetric_plot.html', mode='inline')
-
-per100k_7daysum=bokeh.plotting.figure( tooltips=TOOLTIPS, x_axis_type='datetime')
-p=bokeh.plotting.figure( x_axis_type='datetime',y_range=(0,vmax),
-#                        tooltips=TOOLTIPS,formatters={"$x": "datetime"},
-                        title="{} Number of new cases per 100,000 persons within the last 7 days".format(loi))
-
-p.add_layout(bokeh.models.Title(
-    text="Code: https://github.com/drf5n/YCSD_covid_metrics", text_font_style="italic"), 'above')
-
-p.add_layout(bokeh.models.Title(
-    text="https://drf5n.github.io/YCSD_covid_metrics/YorkCountyCovidMetric_plot.html", text_font_style="italic"), 'above')
-
-
-hth = bokeh.models.HoverTool(tooltips=TOOLTIPS,
-                             formatters={"$x": "datetime",
-                                        "@date": "datetime"
-                                        },
-                             mode='vline',
-                            )
-
-print(hth)
-print(hth.formatters)
-p.add_tools(hth)
-#hover = p.select(dict(type=bokeh.models.HoverTool))
-
-
-#hover(tooltips=TOOLTIPS,
-#)
-
-metric_span = 7
-
-if metric_span == 14: 
-    p.add_layout(bokeh.models.BoxAnnotation(bottom=0,top=5, fill_alpha=0.4, fill_color='teal'))
-    p.add_layout(bokeh.models.BoxAnnotation(bottom=5,top=20, fill_alpha=0.4, fill_color='lightgreen'))
-    p.add_layout(bokeh.models.BoxAnnotation(bottom=20,top=50, fill_alpha=0.4, fill_color='yellow'))
-    p.add_layout(bokeh.models.BoxAnnotation(bottom=50,top=200, fill_alpha=0.4, fill_color='orange'))
-    p.add_layout(bokeh.models.BoxAnnotation(bottom=200, fill_alpha=0.4, fill_color='red'))
-
-if metric_span == 7: 
-    p.add_layout(bokeh.models.BoxAnnotation(bottom=0,top=5, fill_alpha=0.4, fill_color='teal'))
-    p.add_layout(bokeh.models.BoxAnnotation(bottom=5,top=20, fill_alpha=0.4, fill_color='lightgreen'))
-    p.add_layout(bokeh.models.BoxAnnotation(bottom=20,top=50, fill_alpha=0.4, fill_color='yellow'))
-    p.add_layout(bokeh.models.BoxAnnotation(bottom=50,top=200, fill_alpha=0.4, fill_color='orange'))
-    p.add_layout(bokeh.models.BoxAnnotation(bottom=200, fill_alpha=0.4, fill_color='red'))
-
-
-
-#p.line(dfy['date'],dfy['per100k_14daysum'])
-p.line(x='date', y='per100k_7daysum',source=dfy)
-#p.title()
-
-#?p.line
-
-
-# In[12]:
-
-
-bokeh.plotting.show(p)
-
-
-# In[15]:
-
-
-
-bokeh.plotting.save(p,filename="docs/YorkCountyCovidMetric_plot.html",title="Number of new cases per 100,000 persons within the last 7 days")
-
-# needs geckodriver  -- have it in conda env py3plot
-bokeh.io.export_png(p, filename="docs/YorkCountyCovidMetric_plot.png")
-
-
-# In[21]:
-
-
-#?bokeh.plottin
+with runlog.span('plot_7day'):
+    p = locality.plot_7day(dfy, loi)
 
 
 # In[22]:
@@ -255,90 +109,33 @@ bokeh.io.export_png(p, filename="docs/YorkCountyCovidMetric_plot.png")
 increase=(748/56.009)
 inc_days=(30+31+31)
 
-display(increase, inc_days, increase**(1/inc_days))
-
-
-# In[ ]:
-
-
-
+print(increase, inc_days, increase**(1/inc_days))
 
 
 # In[38]:
 
 
-TOOLTIPS = [
- #   ("index", "$index"),
- #   ("date:", "$x{%F %T}"),
-    ("date:", "@date{%F}"),
-    ("cases/7d/100k","@per100k_7daysum"),
-    ("cases/d/100k:","@per100k_1daymean"),    
-    ("cases/d/100k_7d:","@per100k_7daymean"),
-    ("cases/d/100k_14d:","@per100k_14daymean"),
-    ("cases/d/100k_28d:","@per100k_28daymean"),
- #   ("(x,y)", "($x, $y)"),
-]
-
-vmax = (int(dfy['per100k_7daysum'].max() / 40 )+2)*40/7 # 
-
-#bokeh.plotting.output_file('docs/YorkCountyCovidMetric_per_day_plot.html', mode='inline')
-#per100k_7daysum=bokeh.plotting.figure( tooltips=TOOLTIPS, x_axis_type='datetime')
-pp=bokeh.plotting.figure( x_axis_type='datetime',y_range=(0,vmax),
-#                        tooltips=TOOLTIPS,formatters={"$x": "datetime"},
-                        title="{} Average Number of new cases per 100,000 persons over the last 7, 14 or 28 days".format(loi))
-
-pp.add_layout(bokeh.models.Title(
-    text="Code: https://github.com/drf5n/YCSD_covid_metrics", text_font_style="italic"), 'above')
-
-pp.add_layout(bokeh.models.Title(
-    text="https://drf5n.github.io/YCSD_covid_metrics/YorkCountyCovidMetric_per_day_plot.html", text_font_style="italic"), 'above')
-
+with runlog.span('plot_per_day'):
+    pp = locality.plot_per_day(dfy, loi)
 
-hth = bokeh.models.HoverTool(tooltips=TOOLTIPS,
-                             formatters={"$x": "datetime",
-                                        "@date": "datetime"
-                                        },
-                             mode='mouse',
-                            )
 
-print(hth)
-print(hth.formatters)
-pp.add_tools(hth)
-#hover = p.select(dict(type=bokeh.models.HoverTool))
-
-
-#hover(tooltips=TOOLTIPS,
-#)
-
-pp.add_layout(bokeh.models.BoxAnnotation(bottom=0,top=10/7, fill_alpha=0.4, fill_color='blue'))
-pp.add_layout(bokeh.models.BoxAnnotation(bottom=10/7,top=49/7, fill_alpha=0.4, fill_color='yellow'))
-pp.add_layout(bokeh.models.BoxAnnotation(bottom=50/7,top=100/7, fill_alpha=0.4, fill_color='orange'))
-pp.add_layout(bokeh.models.BoxAnnotation(bottom=100/7, fill_alpha=0.3, fill_color='red'))
-
-
-# https://docs.bokeh.org/en/2.4.1/docs/reference/colors.html?highlight=color%20strings#bokeh-colors-named
-pp.circle(x='date', y='per100k_1daymean',source=dfy,color='black',legend_label="Daily")
-pp.line(x='date', y='per100k_28daymean',source=dfy,color='red',legend_label="/28d", line_width=2)
-pp.line(x='date', y='per100k_14daymean',source=dfy,color='darkseagreen',legend_label="/14d", line_width=2)
-pp.line(x='date', y='per100k_7daymean',source=dfy,color="black",legend_label="/7d", line_width=1)
-
-pp.legend.location="top_left"
+# In[ ]:
 
-#p.title()
 
-bokeh.plotting.show(pp)
+with runlog.span('bokeh_save'):
+    print(locality.save_plots(p, pp))
 
-#?p.line
+# the README PNGs, drawn with matplotlib (locality.export_pngs screenshots the bokeh plots instead)
+with runlog.span('locality_png'):
+    print(render.locality_pngs(dfy, loi))
 
 
 # In[ ]:
 
 
-
-print(bokeh.plotting.save(pp,filename="docs/YorkCountyCovidMetric_per_day_plot.html"))
-
-# needs geckodriver  -- have it in conda env py3plot
-bokeh.io.export_png(pp, filename="docs/YorkCountyCovidMetric_per_day_plot.png")
+# the same two plots for every locality on one page, switched with a selector
+with runlog.span('explorer'):
+    print(locality.save_explorer(locality.explorer(df, cw, popxls, loi)))
 
 
 # In[18]:
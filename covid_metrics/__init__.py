@@ -0,0 +1,8 @@
+"""Shared code behind the YCSD_covid_metrics notebooks and scripts."""
+import os
+
+# where the census, VDH population and geometry downloads live
+DOWNLOADS = os.environ.get('COVID_METRICS_DOWNLOADS', '/Users/drf/Downloads/')
+
+# published maps and plots, served on https://drf5n.github.io/YCSD_covid_metrics/
+DOCS = 'docs'
@@ -0,0 +1,193 @@
+"""Benchmarks of each refresh stage on synthetic data at several sizes.
+
+For each scale a synthetic dataset (see synthetic) is written to a scratch
+directory and the stages the refresh is made of are run on it one at a
+time, each timed and memory profiled:
+
+    vdh_load        vdh.load_cases() of the VDH CSV, no cache
+    cdc_load        states.load_cases() of the CDC state CSV
+    windows         CaseWindows.from_frame() by FIPS
+    population      counties.county_metrics(), the population merge
+    geometry_load   counties.load_geometry() of counties.geojson, no cache
+    geo_join        counties.join_geometry()
+    geojson_write   counties.to_geojson() at the maps' detail, written out
+    folium_save     counties.make_map().save() of one county map
+    bokeh_save      locality.plot_7day()/plot_per_day() and save_plots() of one locality
+
+Scale 1 is Virginia-sized (133 localities x 1000 days); scale s has s times
+the rows, split evenly between more localities and more days, so 100 is
+1330 localities x 10000 days.  Results go to a JSON report, one record per
+(scale, stage) with seconds, the tracemalloc peak and the process' peak RSS,
+and `--compare` checks them against an earlier report:
+
+    python -m covid_metrics.bench --scales 1 10 100 --out bench.json
+    python -m covid_metrics.bench --compare bench.json
+
+The tracemalloc peak counts numpy and Python allocations made during the
+stage (not pyarrow's or GEOS'); the RSS is the high water mark of the whole
+run so far, so it only shows stages that set a new one.
+"""
+import os, sys, json, time, math, shutil, platform, argparse, subprocess, tempfile, tracemalloc
+
+from . import synthetic, runlog
+
+SCALES = (1, 10)  # 100 takes a few GB and minutes
+REPORT = 'bench.json'
+THRESHOLD = 1.25  # --compare flags a stage this many times slower than before
+MIN_SECONDS = 0.1  # only flagged if it takes at least this long, or
+MIN_BYTES = 1 << 20  # peaks at this much; smaller ones are mostly noise
+MAP = 'va_counties_map'
+PACKAGES = ['pandas', 'numpy', 'pyarrow', 'geopandas', 'shapely', 'folium', 'bokeh']
+
+
+def dimensions(scale):
+    """(localities, days) of `scale`: scale times the rows of the VA data."""
+    f = math.sqrt(scale)
+    return round(synthetic.LOCALITIES * f), round(synthetic.DAYS * f)
+
+
+class Recorder:
+    """Runs stages, keeping a result record for each."""
+
+    def __init__(self, **info):
+        self.info = info
+        self.records = []
+
+    def __call__(self, stage, func, *args):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.records.append(dict(self.info, stage=stage, seconds=round(seconds, 4),
+                                 peak_traced_bytes=peak, max_rss_bytes=runlog._max_rss()))
+        print(f"{self.info['scale']:>5}x {stage:14s} {seconds:8.2f}s {peak / 2**20:9.1f}MB", file=sys.stderr)
+        return result
+
+
+def _write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+
+def run_scale(scale, workdir, seed=0):
+    """Generate the `scale` dataset in `workdir` and run every stage on it; returns the records."""
+    from . import vdh, windows, states, counties, locality
+
+    localities, days = dimensions(scale)
+    start = time.perf_counter()
+    paths = synthetic.write_dataset(workdir, localities, days, seed)
+    print(f"{scale:>5}x {localities} localities x {days} days generated in {time.perf_counter() - start:.1f}s",
+          file=sys.stderr)
+    coest = synthetic.county_population(synthetic.fips_codes(localities), seed)
+    docs = os.path.join(workdir, 'docs')
+    os.makedirs(docs, exist_ok=True)
+
+    run = Recorder(scale=scale, localities=localities, days=days, rows=localities * days)
+    df = run('vdh_load', vdh.load_cases, paths['VA_vdh_casedata.csv'], True)
+    run('cdc_load', states.load_cases, paths['j8mb-icvb.csv'])
+    cw = run('windows', lambda: windows.CaseWindows.from_frame(df, key='FIPS'))
+    day = df['date'].max().strftime(vdh.DATE_FORMAT)
+    metrics = run('population', counties.county_metrics, df, cw, coest, day)
+    shapes = run('geometry_load', lambda: counties.load_geometry(paths['counties.geojson'], state=None, rebuild=True))
+    x = run('geo_join', counties.join_geometry, shapes, metrics)
+    geojson = run('geojson_write', lambda: _write(os.path.join(workdir, 'counties_map.geojson'),
+                                                  counties.to_geojson(x, counties.MAPS[MAP]['detail'])))
+    with open(geojson) as f:
+        geojson = f.read()
+    run('folium_save', lambda: counties.make_map(geojson, MAP).save(os.path.join(docs, MAP + '.html')))
+
+    def bokeh_save():
+        fips = int(cw.keys[0])
+        dfy = locality.fips_series(cw, fips, 'Locality 0', int(coest['POPESTIMATE2019'].iloc[0]))
+        return locality.save_plots(locality.plot_7day(dfy, 'Locality 0'), locality.plot_per_day(dfy, 'Locality 0'), docs)
+    run('bokeh_save', bokeh_save)
+    return run.records
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def environment():
+    """What the numbers depend on besides the code: machine, Python and library versions."""
+    from importlib import metadata
+
+    versions = {}
+    for name in PACKAGES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return dict(created=time.strftime('%Y-%m-%dT%H:%M:%S%z'), commit=_git_commit(), python=platform.python_version(),
+                platform=platform.platform(), cpus=os.cpu_count(), packages=versions)
+
+
+def run(scales=SCALES, workdir=None, seed=0):
+    """Benchmark every scale; returns the report (environment plus 'results')."""
+    # imported up front, or the first scale's stages pay for it
+    import geopandas, folium, bokeh.plotting
+
+    report = dict(environment(), results=[])
+    base = workdir or tempfile.mkdtemp(prefix='covid_metrics_bench_')
+    try:
+        for scale in scales:
+            report['results'] += run_scale(scale, os.path.join(base, f'{scale}x'), seed)
+    finally:
+        if not workdir:
+            shutil.rmtree(base, ignore_errors=True)
+    return report
+
+
+def compare(old, new, threshold=THRESHOLD, min_seconds=MIN_SECONDS, min_bytes=MIN_BYTES, file=sys.stdout):
+    """Print new/old seconds and traced peak of every (scale, stage) in both reports; returns the slower ones."""
+    before = {(r['scale'], r['stage']): r for r in old['results']}
+    slower = []
+    print(f"{'scale':>6} {'stage':14s} {'old s':>8} {'new s':>8} {'time':>6} {'memory':>6}", file=file)
+    for r in new['results']:
+        o = before.get((r['scale'], r['stage']))
+        if o is None:
+            continue
+        time_ratio = r['seconds'] / o['seconds'] if o['seconds'] else float('inf')
+        mem_ratio = r['peak_traced_bytes'] / o['peak_traced_bytes'] if o['peak_traced_bytes'] else float('inf')
+        flag = ''
+        if ((time_ratio > threshold and r['seconds'] >= min_seconds)
+                or (mem_ratio > threshold and r['peak_traced_bytes'] >= min_bytes)):
+            slower.append(r)
+            flag = '  <-- regression'
+        print(f"{r['scale']:>5}x {r['stage']:14s} {o['seconds']:8.2f} {r['seconds']:8.2f} "
+              f"{time_ratio:6.2f} {mem_ratio:6.2f}{flag}", file=file)
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES, help="(default: %(default)s)")
+    parser.add_argument('--out', default=REPORT, help="JSON report to write (default: %(default)s)")
+    parser.add_argument('--compare', metavar='REPORT', help="an earlier report to compare against")
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help="time or memory ratio counted as a regression (default: %(default)s)")
+    parser.add_argument('--workdir', help="keep the synthetic data here instead of a temporary directory")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    # read first: --compare and --out may well be the same file
+    old = None
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+    report = run(args.scales, args.workdir, args.seed)
+    _write(args.out, json.dumps(report, indent=1))
+    print(args.out)
+    if old is not None and compare(old, report, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""covid-metrics command line.
+
+    covid-metrics counties [--source vdh|nyt] [--day MM/DD/YYYY] [--maps] [--timelapse]
+    covid-metrics states [--day YYYYMMDD] [--map]
+    covid-metrics locality York [--days 14] [--plots]
+    covid-metrics localities [--workers N] [--no-png] [--explorer]
+    covid-metrics refresh [stage ...] [--png static|browser] [--no-png] [--force]
+    covid-metrics runs [--runs 5] [--script update.sh]
+
+Without --maps/--map/--plots the subcommands only print the metrics, which
+needs pandas but none of geopandas, folium or bokeh, so they start quickly
+and are fine to run from cron.
+"""
+import os, sys, argparse
+
+import pandas as pd
+
+from . import DOCS, vdh, windows, pipeline, runlog
+
+
+def _cases(args):
+    if args.download:
+        vdh.download()
+    df = vdh.load_cases()
+    return df, windows.CaseWindows.from_frame(df, key='FIPS')
+
+
+def counties_cmd(args):
+    from . import counties, sources
+
+    source = sources.SOURCES[args.source]
+    if args.timelapse and source.state != counties.STATE_FIPS:
+        sys.exit("--timelapse is only drawn for Virginia (--source vdh)")
+    store = source.snapshots()
+    coestva = counties.load_population(state=source.state)
+    if args.day and store.has(args.day) and not args.timelapse:
+        # a day already stored: its metrics come straight from the snapshot, no history to load
+        day = args.day
+        today_pop = counties.snapshot_metrics(store.read(day), coestva)
+    else:
+        if args.download:
+            source.download()
+        df = source.load()
+        cw = source.windows(df)
+        store.update(df, cw)
+        day = args.day or source.default_day(df)
+        today_pop = counties.county_metrics(df, cw, coestva, day)
+    if today_pop.empty:
+        latest = store.latest()
+        sys.exit(f"no {source.name} data for {day}"
+                 + (f", latest complete is {latest:%m/%d/%Y}" if latest is not None else ", nor any complete day stored"))
+    date = 'Report Date' if 'Report Date' in today_pop else 'date'
+    print(today_pop.sort_values('rank')[['Locality',date,'caseP7P100k','caseP14P100k','caseP28P100k','POPESTIMATE2019']].to_string(index=False))
+
+    if args.maps or args.timelapse:
+        shapes = counties.load_geometry(state=source.state)
+    if args.maps:
+        x = counties.join_geometry(shapes, today_pop)
+        if source.state == counties.STATE_FIPS:
+            paths = counties.save_maps(x, args.docs, workers=os.cpu_count())
+        else:
+            from . import national
+            paths = national.save_maps(x, args.docs, workers=os.cpu_count())
+        for path in paths:
+            print(path)
+    if args.timelapse:
+        from . import timelapse
+        print(timelapse.save_map(df, cw, coestva, shapes, args.docs))
+
+
+def states_cmd(args):
+    from . import states
+
+    store = states.snapshots_store()
+    if args.day and store.has(args.day):
+        doi = args.day
+        dfya = states.snapshot_metrics(store.read(doi), states.load_population())
+    else:
+        if args.download:
+            states.download()
+        df = states.load_cases()
+        cw = states.state_windows(df)
+        store.update(df, cw)
+        doi = args.day or states.default_day(store)
+        dfya = states.state_metrics(df, cw, states.load_population(), doi)
+    print(dfya.sort_values('per100k_28daysum', ascending=False)[['state','date','per100k_1daysum','per100k_7daysum','per100k_28daysum']].to_string(index=False))
+
+    if args.map:
+        states.join_geometry(states.load_geometry(), dfya)
+        print(states.save_map(doi, docs=args.docs))
+
+
+def locality_cmd(args):
+    from . import locality
+
+    df, cw = _cases(args)
+    pop = args.population or locality.locality_population(locality.load_population(), args.name, df)
+    dfy = locality.locality_series(df, cw, args.name, pop)
+    print(dfy.tail(args.days)[['date','TC_diff','per100k_7daysum','per100k_14daysum','per100k_7daymean','per100k_28daymean']].to_string(index=False))
+
+    if args.plots:
+        p, pp = locality.plot_7day(dfy, args.name), locality.plot_per_day(dfy, args.name)
+        for path in locality.save_plots(p, pp, args.docs):
+            print(path)
+
+
+def localities_cmd(args):
+    from . import locality
+
+    df, cw = _cases(args)
+    if args.explorer:
+        print(locality.save_explorer(locality.explorer(df, cw, locality.load_population()), args.docs))
+        return
+    paths = locality.save_all(df, cw, locality.load_population(), args.docs, png=args.png, workers=args.workers)
+    print(f"{len(paths)} files in {os.path.join(args.docs, locality.LOCALITIES_DIR)}")
+
+
+def refresh_cmd(args):
+    p = pipeline.build(docs=args.docs, png=args.png, localities=args.all_localities, national=args.national,
+                       force=args.force)
+    p.run(args.stages or None, workers=args.workers)
+    p.report()
+
+
+def runs_cmd(args):
+    runlog.summary(args.log, args.runs, args.script)
+
+
+def parser():
+    parser = argparse.ArgumentParser(prog='covid-metrics', description="Virginia and US COVID case metrics, maps and plots.")
+    parser.add_argument('--docs', default=DOCS, help="where maps and plots are saved (default: %(default)s)")
+    parser.add_argument('--no-download', dest='download', action='store_false', help="use the VDH CSV already on disk")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('counties', help="per 100k metrics for every Virginia locality (or US county)")
+    p.add_argument('--source', choices=['vdh', 'nyt'], default='vdh',
+                   help="county feed: vdh for Virginia, nyt for every US county (default: %(default)s)")
+    p.add_argument('--day', help="report date, MM/DD/YYYY (default: the latest every county is in)")
+    p.add_argument('--maps', action='store_true', help="also save the folium county maps")
+    p.add_argument('--timelapse', action='store_true', help="also save the county map with a slider over every day")
+    p.set_defaults(func=counties_cmd)
+
+    p = sub.add_parser('states', help="per 100k metrics for every US state (CDC testing data)")
+    p.add_argument('--day', help="date as YYYYMMDD (default: the latest every state is in)")
+    p.add_argument('--map', action='store_true', help="also save the folium state map")
+    p.set_defaults(func=states_cmd)
+
+    p = sub.add_parser('locality', help="recent history of one Virginia locality")
+    p.add_argument('name', help="VDH Locality, e.g. York")
+    p.add_argument('--days', type=int, default=14, help="how many days to print (default: %(default)s)")
+    p.add_argument('--population', type=int, help="skip the VDH population lookup")
+    p.add_argument('--plots', action='store_true', help="also save the bokeh plots")
+    p.set_defaults(func=locality_cmd)
+
+    p = sub.add_parser('localities', help="the locality plots for every Virginia locality")
+    p.add_argument('--workers', type=int, help="processes drawing the plots (default: one per CPU)")
+    p.add_argument('--no-png', dest='png', action='store_false', help="skip the matplotlib PNGs")
+    p.add_argument('--explorer', action='store_true', help="only save the one page with a locality selector")
+    p.set_defaults(func=localities_cmd)
+
+    p = sub.add_parser('refresh', help="the whole update.sh refresh as one pipeline")
+    p.add_argument('stages', nargs='*', help="stages to run (default: all)")
+    p.add_argument('--workers', type=int, default=4)
+    p.add_argument('--png', choices=pipeline.PNG_MODES, default='static',
+                   help="draw PNGs with matplotlib (static) or screenshot the pages in Chrome (browser)")
+    p.add_argument('--no-png', dest='png', action='store_const', const=None, help="skip the PNG exports")
+    p.add_argument('--all-localities', action='store_true', help="also plot every Virginia locality")
+    p.add_argument('--national', choices=['nyt'], help="also map every US county from this feed")
+    p.add_argument('--force', action='store_true', help="redraw every output, changed or not")
+    p.set_defaults(func=refresh_cmd)
+
+    p = sub.add_parser('runs', help="stage times of the latest run against the runs before it")
+    p.add_argument('--log', default=runlog.RUNLOG, help="run log (default: %(default)s)")
+    p.add_argument('--runs', type=int, default=runlog.RUNS, help="earlier runs to compare with (default: %(default)s)")
+    p.add_argument('--script', help="the latest run of this script (update.sh, pipeline.py, ...)")
+    p.set_defaults(func=runs_cmd)
+    return parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    from . import outputs
+    outputs.log_to_stderr()
+    pd.set_option('display.width', 200)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Vectorized branca colormap evaluation.
+
+A branca LinearColormap (what StepColormap(...).to_linear() returns) is a
+table of index values and RGBA colours with linear interpolation between them.
+Calling it on one value at a time is a Python loop per feature, and per date
+once there is more than one day to colour.  `hex_colors` evaluates the same
+table over a whole array of values at once (a 1-D metric column or a
+locality x date array alike), giving the same hex strings the colormap would.
+"""
+import numpy as np
+
+# what the original style functions used for features without a value
+MISSING = '#black'
+
+_HEX = np.array(['%02x' % i for i in range(256)], dtype=object)
+
+
+def table(colormap):
+    """The colormap's (index, RGBA) lookup table as arrays."""
+    return np.asarray(colormap.index, dtype=float), np.asarray(colormap.colors, dtype=float)
+
+
+def rgba(colormap, values):
+    """colormap.rgba_floats_tuple(v) for every v in `values`, as an array of shape values.shape + (4,)."""
+    index, colors = table(colormap)
+    x = np.asarray(values, dtype=float)
+    # same as branca: clamp to the ends, else interpolate within the index interval holding x
+    i = np.clip(np.searchsorted(index, x, side='right'), 1, len(index) - 1)
+    lo, hi = index[i - 1], index[i]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = np.where(hi > lo, (x - lo) / np.where(hi > lo, hi - lo, 1), 1.)
+    p = np.where(x <= index[0], 0., np.where(x >= index[-1], 1., p))[..., None]
+    i = np.where(x <= index[0], 1, i)
+    return (1 - p) * colors[i - 1] + p * colors[i]
+
+
+def hex_colors(colormap, values, missing=MISSING):
+    """colormap(v) for every v in `values`, `missing` where v is NaN/None.
+
+    The strings are '#rrggbb', or '#rrggbbaa' if that is what this version of
+    branca returns.
+    """
+    x = np.asarray(values, dtype=float)
+    channels = (len(colormap(colormap.vmin)) - 1) // 2
+    c = (rgba(colormap, np.nan_to_num(x))[..., :channels] * 255.9999).astype(int)
+    out = '#' + _HEX[c[..., 0]]
+    for j in range(1, channels):
+        out = out + _HEX[c[..., j]]
+    return np.where(np.isnan(x), missing, out)
@@ -0,0 +1,256 @@
+"""Virginia county maps colored by the CDC school and foreign travel thresholds.
+
+This is the library side of AllCountyCovidMetric.ipynb: population from the
+census county estimates, geometry from a US counties.geojson, and folium maps
+saved into docs/.  geopandas, folium and branca are only imported by the
+functions that draw, so the metrics alone load quickly.
+"""
+import os, datetime, multiprocessing
+import concurrent.futures
+
+import pandas as pd
+
+from . import DOWNLOADS, DOCS, vdh, colormaps, geometry, population, schemes, snapshots, windows
+
+# Use population estimates from https://www2.census.gov/programs-surveys/popest/datasets/2010-2019/counties/totals/
+COEST_FILE = population.COEST_FILE
+
+# Find the original file here: https://github.com/python-visualization/folium/tree/master/examples/data
+COUNTIES_GEOJSON = os.path.join(DOWNLOADS, 'counties.geojson')
+
+STATE_FIPS = '51'  # Virginia's GEOIDs in COUNTIES_GEOJSON
+
+GEOJSON_FILE = "vaCovidCounties.geojson"
+
+TOOLTIP_FIELDS = ['Locality','date',"VDH Health District",'caseP7P100k','school','caseP28P100k','foreign',"POPESTIMATE2019"]
+TOOLTIP_ALIASES = ['Locality','Date','VDH District','Cases/7d/100kpop','Community Risk','Cases/28d/100kpop','CDC on Travel','Population']
+
+TITLE_HTML = '''
+             <h3 align="center" style="font-size:16px"><b>{}</b></h3>
+             <h4 align="center" style="font-size:12px"><b>{}</b></h4>
+
+             <a href="https://github.com/drf5n/YCSD_covid_metrics/">(source code)</a>
+             '''
+
+LOCATION, ZOOM = [37.9, -77.9], 7
+
+# docs/<name>.html -> metric column, colorscale window, geometry.DETAIL level and titles;
+# optionally the map's location and zoom and its tooltip (fields, aliases)
+MAPS = {
+    'va_counties_map': dict(
+        metric='caseP7P100k', span=7, detail='medium',
+        title="""Virginia COVID risk per CDC <a href="https://www.cdc.gov/coronavirus/2019-ncov/community/schools-childcare/indicators.html#interpretation">School</a> Risk Categories (school colors)""",
+        subtitle="""(Red is CDC >100cases/7days/100k, "Highest Risk of Transmission" and Black is 5x higher)"""),
+    # New CDC school colors (7 day window)
+    'va_counties_map7': dict(
+        metric='caseP7P100k', span=7, detail='medium',
+        title="""Virginia COVID risk per CDC <a href="https://www.cdc.gov/coronavirus/2019-ncov/community/schools-childcare/k-12-guidance.html">School</a> Risk Categories (school colors)""",
+        subtitle="""(Red is CDC >100cases/7days/100k, "High Risk of Transmission in schools" and Black is 5x higher)"""),
+    'va_counties_map_foreign': dict(
+        metric='caseP28P100k', span=28, detail='medium',
+        title="""Virginia COVID risk colored per CDC <a href="https://www.cdc.gov/coronavirus/2019-ncov/travelers/map-and-travel-notices.html">Foreign Travel</a>
+       Risk Categories """,
+        subtitle="""(Red is CDC Level 4: >100cases/28days/100k, Very High, Avoid all travel" and Black is 10x higher)"""),
+}
+
+
+def default_day(store=None):
+    """The latest report date every locality is in, per the VDH snapshots.Store (MM/DD/YYYY).
+
+    With no snapshots yet: VDH posts each morning, so 'today' is the report date from 28 hours ago.
+    """
+    latest = (store or snapshots.Store('vdh')).latest()
+    if latest is None:
+        latest = datetime.datetime.now()-datetime.timedelta(hours=28)
+    return latest.strftime(vdh.DATE_FORMAT)
+
+
+def load_population(index=None, state=STATE_FIPS):
+    """Census 2019 estimates of the counties of one state (default Virginia, None for all), from population.load()."""
+    index = population.load() if index is None else index
+    rows = population.counties(index, state).dropna(subset=['census'])
+    stnames = index['name'].reindex(rows.index // 1000 * 1000).to_numpy()
+    coest = pd.DataFrame({'FIPS': rows.index.astype(int), 'STNAME': stnames,
+                          'CTYNAME': rows['name'].to_numpy(), 'POPESTIMATE2019': rows['census'].to_numpy(dtype=int)})
+    coest['FIPSstr']=coest['FIPS'].astype(str).str.zfill(5)  # as the GEOIDs
+    return coest
+
+
+def geometry_cache_path(path=COUNTIES_GEOJSON, state=STATE_FIPS):
+    return os.path.splitext(path)[0] + f'.{state or "US"}.parquet'
+
+
+def load_geometry(path=COUNTIES_GEOJSON, state=STATE_FIPS, rebuild=False):
+    """County polygons of one state (by 2 digit FIPS, default Virginia, None for all), indexed by GEOID.
+
+    The whole-US file is only read when it is newer than the state's
+    GeoParquet cache next to it; otherwise the cache is all that's loaded.
+    """
+    import geopandas
+
+    cache = geometry_cache_path(path, state)
+    if not rebuild and os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(path):
+        return geopandas.read_parquet(cache)
+
+    counties = geopandas.read_file(path)
+    counties = counties[counties['GEOID'].str.startswith(state or '')].set_index('GEOID')
+    tmp = cache + '.tmp'
+    counties.to_parquet(tmp)
+    os.replace(tmp, cache)
+    return counties
+
+
+def county_metrics(df, cw, coestva, day):
+    """One row per locality reported on `day`, with population and per 100k rates.
+
+    `cw` is a FIPS keyed `windows.CaseWindows` over `df`, from any sources.SOURCES feed.
+    """
+    today = df[df['date']==pd.to_datetime(day, format=vdh.DATE_FORMAT)]
+    # sums and per 100k rates for every locality on `day` are one slice of the window arrays
+    return _metrics(today, cw.on(day, pop=coestva.set_index('FIPS')['POPESTIMATE2019']), coestva)
+
+
+def snapshot_metrics(snapshot, coestva):
+    """county_metrics() of one day's rows from a snapshots.Store, no history needed."""
+    return _metrics(snapshot, windows.snapshot_rates(snapshot, 'FIPS', coestva.set_index('FIPS')['POPESTIMATE2019']), coestva)
+
+
+def _metrics(today, rates, coestva):
+    # 'Report Date' and 'VDH Health District' only come with the VDH feed
+    columns = [c for c in ['Report Date','FIPS','Locality','VDH Health District','Total Cases','date'] if c in today]
+    today_pop = pd.merge(today[columns],
+                          coestva[['FIPS','FIPSstr','CTYNAME','POPESTIMATE2019']], on='FIPS',
+                          how='left', sort=False)
+    today_pop = pd.merge(today_pop, rates, on=['FIPS','date'], how='left')
+
+    today_pop['caseP7P100k']=today_pop['per100k_7daysum']
+    today_pop['caseP14P100k']=today_pop['per100k_14daysum']
+    today_pop['caseP28P100k']=today_pop['per100k_28daysum']
+
+    today_pop['rank']=(-today_pop['caseP28P100k']).rank()
+    return today_pop
+
+
+def categorize(x, names=('foreign', 'oldschool', 'school')):
+    """Add the CDC foreign travel and school risk category columns (see schemes.SCHEMES)."""
+    for name in names:
+        scheme = schemes.SCHEMES[name]
+        x[name] = scheme.label(x[f'caseP{scheme.span}P100k'])
+    return x
+
+
+def join_geometry(state, today_pop):
+    """County polygons joined with the locality metrics, indexed by GEOID."""
+    if state.index.name != 'GEOID':
+        state = state.set_index('GEOID')
+    x = state.join(today_pop.set_index("FIPSstr"))
+    return categorize(x)
+
+
+def colorscales():
+    """Linear colormaps for the 7, 14 and 28 day per 100k windows."""
+    import branca # for a colorscale
+
+    colorscale14 = branca.colormap.StepColormap(
+        ['blue','green','yellow','orange','red','red','black'],
+        index=[0,20,50,100,500,550,1000], caption='New Cases/14days/100k',vmin=0, vmax=1000,
+    ).to_linear()
+    colorscale14.caption='New Cases/14days/100k'  # reset caption
+
+    colorscale28 = branca.colormap.StepColormap(
+        ['green','yellow','orange','red','red','black'],
+        index=[0,50,100,500,510,550,5000], caption='New Cases/28days/100k',vmin=0, vmax=1000,
+    ).to_linear()
+    colorscale28.caption='New Cases/28days/100k'  # reset caption
+
+    colorscale7 = branca.colormap.StepColormap(
+        ['blue','yellow','orange','red','red','black'],
+        index=[0,10,50,100,125,500], caption='New Cases/7days/100k',vmin=0, vmax=500,
+    ).to_linear()
+    colorscale7.caption='New Cases/7days/100k'  # reset caption
+
+    return {7: colorscale7, 14: colorscale14, 28: colorscale28}
+
+
+STYLE = {'fillOpacity': 0.5, 'weight': 0}
+HIGHLIGHT = {'weight': 2, 'color':'black', 'fillOpacity': 0.4,}
+
+
+def fill_column(metric):
+    return metric + '_fill'
+
+
+def add_fills(x, names=tuple(MAPS), maps=MAPS):
+    """A column of fill colours for each map's metric, each in one vectorized colormap pass."""
+    scales = colorscales()
+    for name in names:
+        spec = maps[name]
+        x[fill_column(spec['metric'])] = colormaps.hex_colors(scales[spec['span']], x[spec['metric']])
+    return x
+
+
+def _tooltip(spec):
+    return spec.get('tooltip', (TOOLTIP_FIELDS, TOOLTIP_ALIASES))
+
+
+def make_map(geojson, name, maps=MAPS):
+    """Build the folium map `name` (a key of `maps`) over `geojson` (GeoJSON, TopoJSON or geometry.publish()ed)."""
+    import folium
+
+    spec = maps[name]
+    colorscale = colorscales()[spec['span']]
+
+    m = folium.Map(location=spec.get('location', LOCATION), zoom_start=spec.get('zoom', ZOOM))
+    fields, aliases = _tooltip(spec)
+    geometry.layer(
+        geojson, fill_column(spec['metric']), STYLE, HIGHLIGHT,
+        tooltip=folium.features.GeoJsonTooltip(fields=fields, aliases=aliases),
+    ).add_to(m)
+    m.add_child(colorscale)
+    m.get_root().html.add_child(folium.Element(TITLE_HTML.format(spec['title'], spec['subtitle'])))
+    return m
+
+
+def to_geojson(x, detail='full', topo=False, maps=MAPS):
+    """`x` as the maps need it: only the tooltip, metric and fill colour columns, geometry at `detail`."""
+    metrics = [spec['metric'] for spec in maps.values()]
+    fields = [field for spec in maps.values() for field in _tooltip(spec)[0]]
+    columns = dict.fromkeys(fields + metrics + [fill_column(m) for m in metrics])
+    return geometry.encode(add_fills(x.copy(), tuple(maps), maps), detail, topo, columns=columns)
+
+
+def _save_map(geojson, name, path, maps=MAPS):
+    make_map(geojson, name, maps).save(path)
+    return path
+
+
+def save_maps(x, docs=DOCS, names=None, workers=1, geojson_file=GEOJSON_FILE, topo=False, maps=MAPS, split=True):
+    """Save each county map, one after another or with `workers` > 1 side by side in a
+    process pool (at most one worker per map); returns the html paths.
+
+    The pool spawns processes that import the caller's __main__, so only ask
+    for one from behind an `if __name__ == '__main__':` guard (the pipeline is).
+
+    The GeoJSON (TopoJSON with `topo`) is serialized in memory once per
+    detail level and handed to every map at that level rather than written to
+    and re-read from disk per map.  With `split` it is not inlined in the
+    pages but published (geometry.publish) as outlines and a table under
+    docs, which the maps of a level share.  The full data is still saved to
+    `geojson_file` (unless that is None) for anyone who wants it.
+    """
+    names = tuple(names or maps)
+    if geojson_file:
+        with open(geojson_file, 'w') as f:
+            f.write(geometry.encode(x))
+    encoded = {detail: to_geojson(x, detail, topo, maps) for detail in {maps[name]['detail'] for name in names}}
+    if split:
+        stem = os.path.commonprefix(names).rstrip('_')
+        encoded = {detail: geometry.publish(data, docs, f'{stem}.{detail}') for detail, data in encoded.items()}
+    geojsons = [encoded[maps[name]['detail']] for name in names]
+    paths = [os.path.join(docs, name + '.html') for name in names]
+    workers = min(workers or 1, len(names))
+    if workers <= 1:
+        return list(map(_save_map, geojsons, names, paths, [maps] * len(names)))
+    # spawn, not fork: the pipeline calls this from a thread while other threads may hold locks
+    with concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return list(pool.map(_save_map, geojsons, names, paths, [maps] * len(names)))
@@ -0,0 +1,113 @@
+"""Conditional, resumable HTTP downloads.
+
+`fetch(url, path)` keeps a local copy of `url` up to date.  What it got is
+recorded next to the file in `<path>.fetch.json` (url, ETag, Last-Modified,
+size, when it was fetched and when it was last checked), and the next fetch
+sends those back as If-None-Match / If-Modified-Since, so an unchanged source
+costs one 304 response.  The body is streamed into `<path>.part` and only
+renamed over `path` once it is complete; an interrupted transfer is picked up
+from where it stopped with a Range request (guarded by If-Range, so a source
+that changed meanwhile is downloaded whole instead).
+
+Only the standard library is used, and any http:// URL will do, e.g. a local
+`http.server` standing in for the real sources.
+"""
+import os, json, time
+import urllib.request, urllib.error
+
+CHUNK = 1 << 20
+TIMEOUT = 60
+
+
+def record_path(path):
+    return path + '.fetch.json'
+
+
+def read_record(path):
+    """What the last fetch of `path` recorded, {} if nothing."""
+    try:
+        with open(record_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp, path)
+
+
+def _validators(headers):
+    return {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+
+
+def fetch(url, path, max_age=0, timeout=TIMEOUT):
+    """Bring `path` up to date with `url`; returns True if new content was written.
+
+    An existing `path` is not checked again until `max_age` seconds after its
+    last check, or ever with `max_age=None`.
+    """
+    record = read_record(path)
+    if os.path.exists(path) and record.get('url', url) == url:
+        if max_age is None or time.time() - record.get('checked', os.path.getmtime(path)) < max_age:
+            return False
+    else:
+        record = {}
+
+    part = path + '.part'
+    partial = read_record(part)
+    headers = {}
+    if record and os.path.exists(path):
+        if record.get('etag'):
+            headers['If-None-Match'] = record['etag']
+        if record.get('last_modified'):
+            headers['If-Modified-Since'] = record['last_modified']
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    validator = partial.get('etag') or partial.get('last_modified')
+    if offset and partial.get('url') == url and validator:
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = validator
+    else:
+        offset = 0
+
+    try:
+        resp = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            record['checked'] = time.time()
+            _write_json(record_path(path), record)
+            return False
+        if e.code == 416 and offset:
+            # the partial file is no good for this source any more
+            os.remove(part)
+            os.remove(record_path(part))
+            return fetch(url, path, max_age, timeout)
+        raise
+
+    with resp:
+        if resp.status == 206 and resp.headers.get('Content-Range', '').startswith(f'bytes {offset}-'):
+            mode = 'ab'
+        else:
+            mode, offset = 'wb', 0
+        # written before the body so an interrupted transfer can be resumed
+        _write_json(record_path(part), dict(_validators(resp.headers), url=url))
+        length = resp.headers.get('Content-Length')
+        size = offset
+        with open(part, mode) as f:
+            while True:
+                block = resp.read(CHUNK)
+                if not block:
+                    break
+                f.write(block)
+                size += len(block)
+    if length is not None and size != offset + int(length):
+        raise IOError(f"{url}: got {size - offset} of {length} bytes, {part} kept to resume")
+
+    os.replace(part, path)
+    now = time.time()
+    _write_json(record_path(path), dict(_validators(resp.headers), url=url, size=size, fetched=now, checked=now,
+                                        resumed_from=offset))
+    os.remove(record_path(part))
+    return True
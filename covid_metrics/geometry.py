@@ -0,0 +1,287 @@
+"""Lighter map geometry: shared-border simplification, coordinate quantization and TopoJSON.
+
+The folium pages embed every polygon vertex as a full precision float, which
+is most of their size.  `encode` takes a joined GeoDataFrame down to one of the
+DETAIL levels before it is serialized: the polygons are simplified as a
+coverage, so neighbouring counties or states keep sharing one (simplified)
+border with no gaps or slivers, and coordinates are rounded to the few decimal
+places a web map can show.  With `topo=True` the result is TopoJSON, where each
+shared border is stored once as a delta-encoded integer arc.
+
+`publish` splits an encoded layer for the published pages: the outlines go
+to a file named by a hash of their contents, which a browser can cache for
+good and the maps of one detail level share, and the per run properties to a
+small table beside them, with their text dictionary encoded.  The page loads
+both and joins them on the feature ids (GEOID or state), so a daily update
+rewrites only the table and a few lines of HTML.
+
+shapely>=2.1 is needed for any level but 'full', and the topojson package for TopoJSON.
+"""
+import os, re, glob, json, hashlib
+
+import numpy as np
+
+# level -> (simplification tolerance in degrees, decimal places kept, TopoJSON quantization)
+# 0.001 degrees is ~100m; a county map of Virginia is ~10 degrees across
+DETAIL = {
+    'full': (0, None, None),
+    'high': (0.001, 4, 1e5),
+    'medium': (0.005, 3, 1e4),
+    'low': (0.02, 2, 2e3),
+}
+
+# the TopoJSON object holding the features, for folium.TopoJson(object_path=...)
+TOPO_OBJECT = 'data'
+
+# publish() writes into this directory under docs, as scripts setting ASSETS_VAR[<file name>]
+ASSETS_DIR = 'assets'
+ASSETS_VAR = 'covidMaps'
+
+
+def simplify(geoms, tolerance):
+    """Simplify polygons that tile a region so neighbours still share their borders."""
+    import shapely
+
+    if not hasattr(shapely, 'coverage_simplify'):
+        # simplifying each polygon on its own would open gaps and overlaps between neighbours
+        raise ImportError(f"simplifying map geometry needs shapely>=2.1 (GEOS 3.12), not {shapely.__version__}")
+    return shapely.coverage_simplify(geoms, tolerance)
+
+
+def quantize(geoms, decimals):
+    """Round every coordinate to `decimals` places (shared vertices round identically)."""
+    import shapely
+
+    return shapely.transform(geoms, lambda xy: np.round(xy, decimals))
+
+
+def prepare(gdf, detail='full'):
+    """A copy of `gdf` with its geometry simplified and quantized to `detail`."""
+    tolerance, decimals, _ = DETAIL[detail]
+    gdf = gdf.copy()
+    if tolerance or decimals is not None:
+        present = gdf.geometry.notna().to_numpy()
+        geoms = np.asarray(gdf.geometry.values)[present]
+        if tolerance:
+            geoms = simplify(geoms, tolerance)
+        if decimals is not None:
+            geoms = quantize(geoms, decimals)
+        gdf.loc[present, gdf.geometry.name] = geoms
+    return gdf
+
+
+def _plain(gdf):
+    """Datetime columns as ISO strings, which neither json nor topojson can serialize."""
+    gdf = gdf.copy()
+    for column in gdf.columns[gdf.dtypes.map(lambda t: t.kind == 'M')]:
+        gdf[column] = gdf[column].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    return gdf
+
+
+def encode(gdf, detail='full', topo=False, columns=None):
+    """`gdf` at `detail` as a GeoJSON string, or as TopoJSON (object TOPO_OBJECT) with `topo`.
+
+    `columns` limits the feature properties to what the map actually shows.
+    """
+    if columns is not None:
+        gdf = gdf[list(columns) + [gdf.geometry.name]]
+    gdf = _plain(prepare(gdf, detail))
+    if topo:
+        import topojson
+
+        quantization = DETAIL[detail][2]
+        return topojson.Topology(gdf, prequantize=quantization or False, object_name=TOPO_OBJECT).to_json()
+    return gdf.to_json()
+
+
+def is_topojson(data):
+    return isinstance(data, str) and data.lstrip().startswith('{') and '"Topology"' in data[:64]
+
+
+def style_js(fill, style):
+    """Leaflet style function: `style` with fillColor from the feature's `fill` property."""
+    return (f"function(feature) {{return Object.assign({json.dumps(style)}, "
+            f"{{fillColor: feature.properties[{json.dumps(fill)}]}});}}")
+
+
+def _read(data):
+    """`data`, read from the file it names if it is a path rather than JSON."""
+    if isinstance(data, str) and not data.lstrip().startswith('{') and os.path.exists(data):
+        with open(data) as f:
+            return f.read()
+    return data
+
+
+def _features(doc):
+    if doc.get('type') == 'Topology':
+        return doc['objects'][TOPO_OBJECT]['geometries']
+    return doc['features']
+
+
+def table(rows):
+    """Property dicts `rows` as columns: a list of values each, or for text {'labels': [...], 'codes': [...]}.
+
+    A code of -1 is a missing value.
+    """
+    columns = {}
+    for name in dict.fromkeys(name for row in rows for name in row):
+        values = [row.get(name) for row in rows]
+        if any(isinstance(v, str) for v in values):
+            labels = list(dict.fromkeys(v for v in values if v is not None))
+            codes = {label: i for i, label in enumerate(labels)}
+            columns[name] = {'labels': labels, 'codes': [codes.get(v, -1) for v in values]}
+        else:
+            columns[name] = values
+    return columns
+
+
+def split(data):
+    """Encoded GeoJSON or TopoJSON `data` as (outlines, {'id': [...], 'columns': table()}).
+
+    The outlines are `data` without the feature properties, as compact JSON.
+    """
+    doc = json.loads(_read(data))
+    features = _features(doc)
+    rows = [feature.pop('properties', None) or {} for feature in features]
+    ids = [feature.get('id') for feature in features]
+    return json.dumps(doc, separators=(',', ':')), {'id': ids, 'columns': table(rows)}
+
+
+def _script(key, text):
+    return f"(window.{ASSETS_VAR} = window.{ASSETS_VAR} || {{}})[{json.dumps(key)}] = {text};\n"
+
+
+def _write(path, text):
+    with open(path + '.tmp', 'w') as f:
+        f.write(text)
+    os.replace(path + '.tmp', path)
+
+
+def publish(data, docs, stem):
+    """Write encoded `data` (or a file of it) as docs/ASSETS_DIR/<stem>.<hash>.<geojson|topojson>.js
+    outlines and a <stem>.data.js table; returns their (outlines, table) URLs relative to docs, for layer().
+
+    Older outlines of `stem` are removed.  The table's URL carries a hash of it
+    as a query, so a cached copy from an earlier run isn't used.
+    """
+    outlines, rows = split(data)
+    rows = json.dumps(rows, separators=(',', ':'))
+    folder = os.path.join(docs, ASSETS_DIR)
+    os.makedirs(folder, exist_ok=True)
+    kind = 'topojson' if is_topojson(outlines) else 'geojson'
+    name = f"{stem}.{hashlib.sha256(outlines.encode()).hexdigest()[:12]}.{kind}.js"
+    if not os.path.exists(os.path.join(folder, name)):
+        _write(os.path.join(folder, name), _script(name, outlines))
+    for old in glob.glob(os.path.join(folder, glob.escape(stem) + '.*.js')):
+        if os.path.basename(old) not in (name, stem + '.data.js'):
+            os.remove(old)
+    _write(os.path.join(folder, stem + '.data.js'), _script(stem + '.data.js', rows))
+    version = hashlib.sha256(rows.encode()).hexdigest()[:12]
+    return f"{ASSETS_DIR}/{name}", f"{ASSETS_DIR}/{stem}.data.js?{version}"
+
+
+def assets(pages):
+    """The published outlines and tables the saved html `pages` (a path or a list of them) load."""
+    pages = [pages] if isinstance(pages, str) else pages
+    found = []
+    for page in pages:
+        with open(page) as f:
+            found += [os.path.join(os.path.dirname(page), src)
+                      for src in re.findall(r'<script src="(' + ASSETS_DIR + r'/[^"?]+)', f.read())]
+    return list(dict.fromkeys(found))
+
+
+def is_published(data):
+    return isinstance(data, tuple) and len(data) == 2
+
+
+# the layer of a published page: the outlines joined with the table in the browser
+PUBLISHED = """
+{% macro script(this, kwargs) %}
+(function() {
+    const assets = window.""" + ASSETS_VAR + """;
+    const outlines = assets[{{ this.outlines|tojson }}], rows = assets[{{ this.table|tojson }}];
+    const features = outlines.type === 'Topology'
+        ? topojson.feature(outlines, outlines.objects[{{ this.object|tojson }}]).features : outlines.features;
+    const row = new Map(rows.id.map((id, i) => [id, i]));
+    const columns = Object.entries(rows.columns).map(([name, c]) =>
+        [name, Array.isArray(c) ? (i) => c[i] : (i) => (c.codes[i] < 0 ? null : c.labels[c.codes[i]])]);
+    for (const feature of features) {
+        const i = row.get(feature.id);
+        feature.properties = {};
+        if (i !== undefined) for (const [name, value] of columns) feature.properties[name] = value(i);
+    }
+    const style = {{ this.style }};
+    const highlight = {{ this.highlight|tojson }};
+    const fields = {{ this.fields|tojson }}, aliases = {{ this.aliases|tojson }};
+    const {{ this.get_name() }} = L.geoJson({type: 'FeatureCollection', features: features}, {
+        style: style,
+        onEachFeature: function(feature, layer) {
+            if (!highlight) return;
+            layer.on({
+                mouseover: (e) => e.target.setStyle(highlight),
+                mouseout: (e) => e.target.setStyle(style(feature)),
+            });
+        },
+    }).addTo({{ this._parent.get_name() }});
+    if (fields.length) {{ this.get_name() }}.bindTooltip((l) => '<table>' + fields.map((field, k) =>
+        `<tr><th>${aliases[k]}</th><td>${l.feature.properties[field] ?? ''}</td></tr>`).join('') + '</table>', {sticky: true});
+})();
+{% endmacro %}
+"""
+
+
+def _published_layer(data, fill, style, highlight, tooltip):
+    import folium
+    from folium.elements import JSCSSMixin
+    from jinja2 import Template
+
+    class Published(JSCSSMixin):
+        _template = Template(PUBLISHED)
+
+        def __init__(self):
+            super().__init__()
+            self._name = 'Published'
+            self.outlines, self.table = (os.path.basename(src.split('?')[0]) for src in data)
+            self.object, self.style, self.highlight = TOPO_OBJECT, style_js(fill, style), highlight
+            self.fields = list(tooltip.fields) if tooltip else []
+            self.aliases = list(tooltip.aliases or tooltip.fields) if tooltip else []
+            # the outlines and table load before the map script, from files beside the page
+            self.default_js = [(src.split('?')[0], src) for src in data]
+            if self.outlines.endswith('.topojson.js'):
+                self.default_js.insert(0, ('topojson', dict(folium.TopoJson.default_js)['topojson']))
+
+    return Published()
+
+
+def layer(data, fill, style, highlight=None, tooltip=None, name='geojson'):
+    """A folium layer for `data` from `encode` (or a file of it): TopoJson for TopoJSON, else GeoJson.
+
+    Each feature is filled with the colour in its `fill` property (see
+    colormaps.hex_colors) plus the Leaflet path options in `style`, and
+    `highlight` on hover.  For GeoJSON that is done by a few lines of
+    JavaScript, so folium calls no Python per feature; folium.TopoJson copies
+    the colour into each feature's style itself and has no hover highlight.
+    `data` from `publish` is loaded from its files and joined in the page.
+    """
+    import folium
+    from folium.utilities import JsCode
+
+    if is_published(data):
+        return _published_layer(data, fill, style, highlight, tooltip)
+    data = _read(data)
+
+    if is_topojson(data):
+        return folium.TopoJson(json.loads(data), 'objects.' + TOPO_OBJECT, name=name,
+                               style_function=lambda feature: dict(style, fillColor=feature['properties'][fill]),
+                               tooltip=tooltip)
+    styler = style_js(fill, style)
+    on_each_feature = None
+    if highlight:
+        on_each_feature = JsCode(f"""function(feature, layer) {{
+            layer.on({{
+                mouseover: function(e) {{e.target.setStyle({json.dumps(highlight)});}},
+                mouseout: function(e) {{e.target.setStyle(({styler})(feature));}},
+            }});
+        }}""")
+    return folium.GeoJson(data, name=name, tooltip=tooltip, style=JsCode(styler), on_each_feature=on_each_feature)
@@ -0,0 +1,450 @@
+"""Time series plots of the case metric for Virginia localities.
+
+The library side of YorkCountyCovidMetric.ipynb: the new cases per 100k over
+the last 7 days against the CDC school bands, and the daily rate with its
+7, 14 and 28 day means.  `save_all` draws the same two plots for every
+locality, and `explorer` puts every locality on one page with a selector.
+The pages carry only the plotted columns, as binary arrays, and a long
+history starts out LTTB downsampled to POINTS, every day showing once zoomed
+in.  bokeh is only imported to draw.
+"""
+import os, re, itertools
+import concurrent.futures, multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from . import DOCS, population
+
+# Read VDH population data donwloaded from https://apps.vdh.virginia.gov/HealthStats/stats.htm
+# and https://apps.vdh.virginia.gov/HealthStats/documents/xls/2018%20Pop.xls
+POP_XLS = population.VDH_XLS
+
+PAGES = 'https://drf5n.github.io/YCSD_covid_metrics/'
+
+# (bottom, top, color, alpha) shading behind the plots, per the CDC school risk levels
+BANDS_7DAY = [
+    (0, 5, 'teal', 0.4),
+    (5, 20, 'lightgreen', 0.4),
+    (20, 50, 'yellow', 0.4),
+    (50, 200, 'orange', 0.4),
+    (200, None, 'red', 0.4),
+]
+BANDS_PER_DAY = [
+    (0, 10/7, 'blue', 0.4),
+    (10/7, 49/7, 'yellow', 0.4),
+    (50/7, 100/7, 'orange', 0.4),
+    (100/7, None, 'red', 0.3),
+]
+
+
+def load_population(index=None):
+    """The VDH populations (Locality, Population, FIPS) from population.load(), Virginia's total as FIPS 51000."""
+    index = population.load() if index is None else index
+    rows = index[index['vdh'].notna() & (index.index // 1000 == 51)]
+    return pd.DataFrame({'Code': rows.index - 51000, 'Locality': rows['locality'].to_numpy(),
+                         'Population': rows['vdh'].to_numpy(), 'FIPS': rows.index.astype(int)})
+
+
+def locality_population(popxls, loi, df):
+    """Population of VDH Locality `loi`, looked up by its FIPS in the case data `df`."""
+    fips = df.loc[df['Locality']==loi, 'FIPS'].iloc[0]
+    return int(popxls.set_index('FIPS').at[fips, 'Population'])
+
+
+def locality_series(df, cw, loi, pop):
+    """The per 100k history of Locality `loi` from a FIPS keyed CaseWindows."""
+    fips = df.loc[df['Locality']==loi, 'FIPS'].iloc[0]
+    return fips_series(cw, fips, loi, pop)
+
+
+def fips_series(cw, fips, loi, pop):
+    """locality_series() by FIPS, for when the Locality name is already known."""
+    dfy = cw.series(fips, pop=pop)
+    dfy['Locality'] = loi
+    dfy['per100k_1daymean']=dfy['per100k_1daysum']
+    dfy['per100k_7daymean']=dfy['per100k_7daysum']/7
+    dfy['per100k_14daymean']=dfy['per100k_14daysum']/14
+    dfy['per100k_28daymean']=dfy['per100k_28daysum']/28
+    return dfy
+
+
+TITLE_7DAY = "{} Number of new cases per 100,000 persons within the last 7 days"
+TITLE_PER_DAY = "{} Average Number of new cases per 100,000 persons over the last 7, 14 or 28 days"
+
+# (column, color, legend, width) of the mean lines on the per day plot
+LINES_PER_DAY = [
+    ('per100k_28daymean', 'red', "/28d", 2),
+    ('per100k_14daymean', 'darkseagreen', "/14d", 2),
+    ('per100k_7daymean', "black", "/7d", 1),
+]
+
+
+# the columns each plot draws or shows in its tooltips; only these go in its page
+COLUMNS_7DAY = ['per100k_7daysum', 'per100k_14daysum']
+COLUMNS_PER_DAY = ['per100k_7daysum', 'per100k_1daymean', 'per100k_7daymean', 'per100k_14daymean', 'per100k_28daymean']
+
+# most points a plot is drawn with before zooming in: past this the series is LTTB downsampled
+POINTS = 400
+
+# on a zoom or pan: every row in view once there are `points` or fewer, else the overview
+ZOOM_JS = """
+const x = series.data.date, n = x.length;
+const first = (t) => {
+    let lo = 0, hi = n;
+    while (lo < hi) { const mid = (lo + hi) >> 1; if (x[mid] < t) lo = mid + 1; else hi = mid; }
+    return lo;
+};
+const lo = Math.max(first(cb_obj.x0) - 1, 0), hi = Math.min(first(cb_obj.x1) + 1, n);
+if (hi - lo > points) {
+    view.data = {...overview.data};
+} else {
+    const data = {};
+    for (const [k, v] of Object.entries(series.data)) data[k] = v.slice(lo, hi);
+    view.data = data;
+}
+"""
+
+
+def lttb(x, y, n):
+    """Indices of the `n` points of (x, y) kept by Largest-Triangle-Three-Buckets, the ends included."""
+    m = len(x)
+    if n >= m or n < 3:
+        return np.arange(m)
+    edges = np.linspace(1, m - 1, n - 1).astype(int)  # n - 2 buckets between the first and last point
+    keep = np.empty(n, dtype=np.int64)
+    keep[0], keep[-1] = 0, m - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # the next bucket's mean, just the last point after the last bucket
+        following = slice(hi, edges[i + 2] if i + 3 < n else m)
+        cx, cy = x[following].mean(), y[following].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = keep[i + 1] = lo + int(area.argmax())
+    return keep
+
+
+def downsample(data, columns, points=POINTS):
+    """Rows of `data` ({'date': ..., column: array}) keeping the shape of each of `columns`, about `points` of them.
+
+    Each column gets an equal share of `points` from lttb(), over its finite
+    values; the rows are the union of them.
+    """
+    x = data['date']
+    keep = [np.array([0, len(x) - 1])]
+    for column in columns:
+        ok = np.flatnonzero(np.isfinite(data[column]))
+        keep.append(ok[lttb(x[ok], data[column][ok], points // len(columns))])
+    return np.unique(np.concatenate(keep))
+
+
+def _data(dfy, columns):
+    """The dates (ms) and `columns` (float32) of `dfy` as arrays, which bokeh embeds as binary."""
+    data = {'date': dfy['date'].to_numpy('datetime64[ms]').astype(np.float64)}
+    for column in columns:
+        data[column] = dfy[column].to_numpy(np.float32)
+    return data
+
+
+def _source(fig, columns, points):
+    """The source `fig` draws from, with `points` set the view of a downsampled series (see _fill)."""
+    import bokeh.models, bokeh.events
+
+    view = bokeh.models.ColumnDataSource({column: [] for column in ['date'] + columns})
+    if points:
+        zoom = bokeh.models.CustomJS(name='zoom', code=ZOOM_JS, args=dict(
+            series=bokeh.models.ColumnDataSource(), overview=bokeh.models.ColumnDataSource(), view=view, points=points))
+        fig.js_on_event(bokeh.events.RangesUpdate, zoom)
+    return view
+
+
+def _fill(fig, dfy):
+    """Put `dfy` in the sources of `fig`, downsampled if _source() made it so."""
+    view = fig.renderers[0].data_source
+    data = _data(dfy, [column for column in view.data if column != 'date'])
+    zoom = fig.select_one({'name': 'zoom'})
+    if zoom is None:
+        view.data = data
+        return
+    rows = downsample(data, [r.glyph.y for r in fig.renderers], zoom.args['points'])
+    zoom.args['series'].data = data
+    zoom.args['overview'].data = {column: values[rows] for column, values in data.items()}
+    view.data = dict(zoom.args['overview'].data)
+
+
+def vmax_7day(dfy):
+    return (int(dfy['per100k_7daysum'].max() / 40 )+2)*40
+
+
+def _bands(p, bands):
+    import bokeh.models
+
+    for bottom, top, color, alpha in bands:
+        p.add_layout(bokeh.models.BoxAnnotation(bottom=bottom, top=top, fill_alpha=alpha, fill_color=color))
+
+
+def _titles(p, page):
+    import bokeh.models
+
+    p.add_layout(bokeh.models.Title(
+        text="Code: https://github.com/drf5n/YCSD_covid_metrics", text_font_style="italic"), 'above')
+    p.add_layout(bokeh.models.Title(
+        text=PAGES + page, text_font_style="italic", name='page'), 'above')
+
+
+def plot_7day(dfy, loi, page='YorkCountyCovidMetric_plot.html', metric_span=7, points=POINTS):
+    """The 7 day sum per 100k of `dfy` over the CDC school bands.
+
+    Only the plotted columns go in the page.  Longer than `points` days, the
+    line starts downsampled and shows every day once zoomed in; `points=None`
+    always draws every day.
+    """
+    import bokeh.plotting, bokeh.models
+
+    TOOLTIPS = [
+        ("date:", "@date{%F}"),
+        ("cases/7d/100k:","@per100k_7daysum"),
+        ("cases/14d/100k:","@per100k_14daysum"),
+    ]
+
+    vmax = vmax_7day(dfy)
+
+    p=bokeh.plotting.figure( x_axis_type='datetime',y_range=(0,vmax),
+                            title=TITLE_7DAY.format(loi))
+    _titles(p, page)
+
+    hth = bokeh.models.HoverTool(tooltips=TOOLTIPS,
+                                 formatters={"$x": "datetime",
+                                            "@date": "datetime"
+                                            },
+                                 mode='vline',
+                                )
+    p.add_tools(hth)
+
+    if metric_span in (7, 14):
+        _bands(p, BANDS_7DAY)
+
+    source = _source(p, COLUMNS_7DAY, points)
+    p.line(x='date', y='per100k_7daysum',source=source)
+    _fill(p, dfy)
+    return p
+
+
+def plot_per_day(dfy, loi, page='YorkCountyCovidMetric_per_day_plot.html', points=POINTS):
+    """The daily rate per 100k of `dfy` with its 7, 14 and 28 day means; `points` as for plot_7day()."""
+    import bokeh.plotting, bokeh.models
+
+    TOOLTIPS = [
+        ("date:", "@date{%F}"),
+        ("cases/7d/100k","@per100k_7daysum"),
+        ("cases/d/100k:","@per100k_1daymean"),
+        ("cases/d/100k_7d:","@per100k_7daymean"),
+        ("cases/d/100k_14d:","@per100k_14daymean"),
+        ("cases/d/100k_28d:","@per100k_28daymean"),
+    ]
+
+    vmax = vmax_7day(dfy)/7
+
+    pp=bokeh.plotting.figure( x_axis_type='datetime',y_range=(0,vmax),
+                            title=TITLE_PER_DAY.format(loi))
+    _titles(pp, page)
+
+    hth = bokeh.models.HoverTool(tooltips=TOOLTIPS,
+                                 formatters={"$x": "datetime",
+                                            "@date": "datetime"
+                                            },
+                                 mode='mouse',
+                                )
+    pp.add_tools(hth)
+
+    _bands(pp, BANDS_PER_DAY)
+
+    # https://docs.bokeh.org/en/2.4.1/docs/reference/colors.html?highlight=color%20strings#bokeh-colors-named
+    source = _source(pp, COLUMNS_PER_DAY, points)
+    pp.scatter(x='date', y='per100k_1daymean',source=source,color='black',legend_label="Daily")
+    for column, color, legend, width in LINES_PER_DAY:
+        pp.line(x='date', y=column,source=source,color=color,legend_label=legend, line_width=width)
+    _fill(pp, dfy)
+
+    pp.legend.location="top_left"
+    return pp
+
+
+def save_plots(p, pp, docs=DOCS, prefix='YorkCountyCovidMetric'):
+    """Save the 7 day and per day plots; returns the html paths."""
+    import bokeh.plotting
+
+    paths = [os.path.join(docs, prefix + '_plot.html'), os.path.join(docs, prefix + '_per_day_plot.html')]
+    # CDN is what save() falls back to anyway, minus a warning per call
+    bokeh.plotting.save(p,filename=paths[0],resources='cdn',title="Number of new cases per 100,000 persons within the last 7 days")
+    bokeh.plotting.save(pp,filename=paths[1],resources='cdn',title="Average number of new cases per 100,000 persons over the last 7, 14 or 28 days")
+    return paths
+
+
+def export_pngs(p, pp, docs=DOCS, prefix='YorkCountyCovidMetric', pool=None):
+    """PNGs of both plots, rendered in a session from `pool` (a screenshots.BrowserPool)."""
+    import bokeh.io
+    from . import screenshots
+
+    if pool is None:
+        with screenshots.BrowserPool(1) as pool:
+            return export_pngs(p, pp, docs, prefix, pool)
+    paths = [os.path.join(docs, prefix + '_plot.png'), os.path.join(docs, prefix + '_per_day_plot.png')]
+    with pool.browser() as browser:
+        bokeh.io.export_png(p, filename=paths[0], webdriver=browser, timeout=pool.timeout)
+        bokeh.io.export_png(pp, filename=paths[1], webdriver=browser, timeout=pool.timeout)
+    return paths
+
+
+# where save_all puts each locality's pages, under docs
+LOCALITIES_DIR = 'localities'
+
+
+def slug(loi):
+    """File name part for Locality `loi`: 'Virginia Beach' -> 'VirginiaBeach'."""
+    return re.sub(r'\W+', '', loi)
+
+
+def restyle(p, pp, dfy, loi, page, page_per_day):
+    """Point the figures from plot_7day() and plot_per_day() at another locality's `dfy`.
+
+    The figures, tools and band annotations stay as they are; only the data,
+    y ranges and titles change, which is much cheaper than drawing them again.
+    """
+    vmax = vmax_7day(dfy)
+    for fig, title, end, pg in ((p, TITLE_7DAY, vmax, page), (pp, TITLE_PER_DAY, vmax/7, page_per_day)):
+        _fill(fig, dfy)
+        fig.y_range.end = end
+        fig.title.text = title.format(loi)
+        fig.select_one({'name': 'page'}).text = PAGES + pg
+    return p, pp
+
+
+_plots = None  # each worker's figures, restyled for every locality it is given
+
+
+def _save_locality(dfy, loi, docs, png):
+    global _plots
+
+    prefix = os.path.join(LOCALITIES_DIR, slug(loi) + 'CovidMetric')
+    page, page_per_day = prefix + '_plot.html', prefix + '_per_day_plot.html'
+    if _plots is None:
+        _plots = plot_7day(dfy, loi, page=page), plot_per_day(dfy, loi, page=page_per_day)
+    else:
+        restyle(*_plots, dfy, loi, page, page_per_day)
+    paths = save_plots(*_plots, docs=docs, prefix=prefix)
+    if png:
+        from . import render
+        paths += render.locality_pngs(dfy, loi, docs, prefix)
+    return paths
+
+
+def localities(df, cw, popxls):
+    """(FIPS -> Locality, FIPS -> Population) of the localities in `df` with a population in `popxls`."""
+    names = df.drop_duplicates('FIPS', keep='last').set_index('FIPS')['Locality']
+    pop = popxls.drop_duplicates('FIPS').set_index('FIPS')['Population']
+    names = names[names.index.isin(pop.dropna().index) & names.index.isin(cw.keys)]
+    return names, pop.reindex(names.index)
+
+
+def save_all(df, cw, popxls, docs=DOCS, png=True, workers=None):
+    """The 7 day and per day plots (and with `png` their PNGs) of every locality in `df`.
+
+    They go to docs/LOCALITIES_DIR/<slug>CovidMetric_*.  The series are cut
+    from `cw` here, once; drawing and saving is spread over a process pool
+    (`workers` defaults to the number of CPUs), each worker drawing the figures
+    once and restyling them for the rest of its localities.  Localities
+    without a population in `popxls` are skipped.  Returns the paths.
+    """
+    os.makedirs(os.path.join(docs, LOCALITIES_DIR), exist_ok=True)
+    names, pop = localities(df, cw, popxls)
+    dfys = [fips_series(cw, fips, loi, pop[fips]) for fips, loi in names.items()]
+
+    workers = workers or os.cpu_count() or 1
+    jobs = (dfys, list(names), itertools.repeat(docs), itertools.repeat(png))
+    if workers == 1:
+        paths = map(_save_locality, *jobs)
+    else:
+        # spawn, not fork: the pipeline calls this from a thread while other threads may hold locks
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            paths = list(pool.map(_save_locality, *jobs, chunksize=max(1, len(dfys) // (4*workers))))
+    return [path for p in paths for path in p]
+
+
+EXPLORER_FILE = 'va_localities_plot.html'
+
+# per100k_<n>daysum columns kept in the explorer's store; the means and dates are made in the page
+EXPLORER_SPANS = (1, 7, 14, 28)
+
+EXPLORER_JS = """
+const i = names.indexOf(this.value), off = i * days;
+if (i < 0) return;
+const data = {date: new Float64Array(days)};
+for (let d = 0; d < days; d++) data.date[d] = start + d * 86400000;
+for (const span of spans) {
+    const sum = Float64Array.from(store.data[`per100k_${span}daysum`].slice(off, off + days));
+    data[`per100k_${span}daysum`] = sum;
+    data[`per100k_${span}daymean`] = sum.map((v) => v / span);
+}
+source.data = data;
+p.y_range.end = vmax[i];
+pp.y_range.end = vmax[i] / 7;
+p.title.text = title_7day.replace('{}', this.value);
+pp.title.text = title_per_day.replace('{}', this.value);
+"""
+
+
+def explorer(df, cw, popxls, loi='York'):
+    """One bokeh layout with the 7 day and per day plots of every locality and a selector.
+
+    All the localities' per 100k sums are in one ColumnDataSource of float32
+    columns, row major by locality over every date of `cw`, which bokeh embeds
+    as binary.  Picking a locality copies its rows (plus the dates and means,
+    worked out in the page) into the small source the figures draw from, so
+    no server is needed.  The figures are drawn afresh for `loi`: ones already
+    saved belong to another bokeh document.
+    """
+    import bokeh.layouts, bokeh.models
+
+    names, pop = localities(df, cw, popxls)
+    names = names.sort_values()
+    if loi not in set(names):
+        loi = names.iloc[0]
+    rows = cw.keys.get_indexer(names.index)
+    rates = cw.per100k(pop)[rows]
+    rates[np.broadcast_to(~cw.observed[rows][:, None, :], rates.shape)] = np.nan
+    store = bokeh.models.ColumnDataSource({f'per100k_{span}daysum': rates[:, cw.spans.index(span)].astype(np.float32).ravel()
+                                           for span in EXPLORER_SPANS})
+
+    def columns(k):
+        data = {'date': cw.dates}
+        for span in EXPLORER_SPANS:
+            data[f'per100k_{span}daysum'] = rates[k, cw.spans.index(span)]
+            data[f'per100k_{span}daymean'] = data[f'per100k_{span}daysum'] / span
+        return pd.DataFrame(data)
+
+    k = list(names).index(loi)
+    dfy = columns(k)
+    # not downsampled: the page swaps in a whole series at a time
+    p, pp = plot_7day(dfy, loi, page=EXPLORER_FILE, points=None), plot_per_day(dfy, loi, page=EXPLORER_FILE, points=None)
+    vmax = [vmax_7day(pd.DataFrame({'per100k_7daysum': rates[j, cw.spans.index(7)]})) for j in range(len(names))]
+    source = bokeh.models.ColumnDataSource(dfy)
+    for fig in (p, pp):
+        for r in fig.renderers:
+            r.data_source = source
+
+    select = bokeh.models.Select(title="Locality", value=loi, options=list(names))
+    select.js_on_change('value', bokeh.models.CustomJS(code=EXPLORER_JS, args=dict(
+        names=list(names), store=store, source=source, days=len(cw.dates), spans=list(EXPLORER_SPANS),
+        start=cw.dates[0].timestamp() * 1000, vmax=vmax, p=p, pp=pp, title_7day=TITLE_7DAY, title_per_day=TITLE_PER_DAY)))
+    return bokeh.layouts.column(select, p, pp)
+
+
+def save_explorer(layout, docs=DOCS):
+    """Save explorer()'s layout as docs/EXPLORER_FILE; returns the path."""
+    import bokeh.plotting
+
+    path = os.path.join(docs, EXPLORER_FILE)
+    bokeh.plotting.save(layout, filename=path, resources='cdn', title="Virginia localities: new cases per 100,000 persons")
+    return path
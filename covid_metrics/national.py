@@ -0,0 +1,47 @@
+"""The county maps for every US county, from any sources.SOURCES feed.
+
+Same windows, CDC schemes, fills and folium maps as the Virginia ones in
+counties, fed by a national feed (the NYT county histories by default) with
+every county's census population and outline.  At this size the map pages
+default to TopoJSON at the 'low' detail level.
+
+    covid-metrics counties --source nyt --maps
+"""
+from . import DOCS, counties, sources
+
+TOOLTIP = (['Locality', 'date', 'caseP7P100k', 'school', 'caseP28P100k', 'foreign', 'POPESTIMATE2019'],
+           ['County', 'Date', 'Cases/7d/100kpop', 'Community Risk', 'Cases/28d/100kpop', 'CDC on Travel', 'Population'])
+
+MAPS = {
+    'us_counties_map': dict(
+        metric='caseP7P100k', span=7, detail='low', location=[38.5, -96.5], zoom=4, tooltip=TOOLTIP,
+        title="""US county COVID risk per CDC <a href="https://www.cdc.gov/coronavirus/2019-ncov/community/schools-childcare/indicators.html#interpretation">School</a> Risk Categories (school colors)""",
+        subtitle="""(Red is CDC >100cases/7days/100k, "Highest Risk of Transmission" and Black is 5x higher)"""),
+    'us_counties_map_foreign': dict(
+        metric='caseP28P100k', span=28, detail='low', location=[38.5, -96.5], zoom=4, tooltip=TOOLTIP,
+        title="""US county COVID risk colored per CDC <a href="https://www.cdc.gov/coronavirus/2019-ncov/travelers/map-and-travel-notices.html">Foreign Travel</a>
+       Risk Categories """,
+        subtitle="""(Red is CDC Level 4: >100cases/28days/100k, Very High, Avoid all travel" and Black is 10x higher)"""),
+}
+
+
+def save_maps(x, docs=DOCS, topo=True, workers=1, geojson_file=None):
+    """counties.save_maps() of MAPS.  The full resolution GeoJSON of every county is ~30MB, so only written if asked."""
+    return counties.save_maps(x, docs, workers=workers, geojson_file=geojson_file, topo=topo, maps=MAPS)
+
+
+def refresh(source='nyt', day=None, docs=DOCS, download=True, maps=True):
+    """Load `source`, window it and (with `maps`) save MAPS for `day`; returns the metrics and paths."""
+    source = sources.SOURCES[source]
+    if download:
+        source.download()
+    df = source.load()
+    cw = source.windows(df)
+    source.snapshots().update(df, cw)
+    day = day or source.default_day(df)
+    metrics = counties.county_metrics(df, cw, counties.load_population(state=source.state), day)
+    paths = []
+    if maps:
+        x = counties.join_geometry(counties.load_geometry(state=source.state), metrics)
+        paths = save_maps(x, docs)
+    return metrics, paths
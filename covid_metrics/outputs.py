@@ -0,0 +1,212 @@
+"""Skip regenerating outputs whose inputs haven't changed.
+
+Each output stage (a map, a plot page, its PNGs) is keyed by a content hash
+of its inputs: the data it is drawn from, anything else it is told (a date,
+a locality), the package source (thresholds, colours, templates and titles
+all live there) and the versions of the libraries that render it.  A
+Manifest, saved as MANIFEST next to the outputs, records the key and the
+result of each stage's last run:
+
+    manifest = outputs.Manifest(os.path.join(docs, outputs.MANIFEST))
+    save = outputs.cached(manifest, 'county_maps', lambda x: counties.save_maps(x, docs))
+    paths = save(x)   # the recorded paths, without drawing, if x hashes as last time
+
+A stage is redone when its key changed or one of the files it returned (or
+that `files` lists for it, say the assets its pages load) is gone.  Results have to be JSON (paths, lists of paths); files among the
+inputs are hashed by content when wrapped in File.
+
+    python -m covid_metrics.outputs exec --inputs X.ipynb --outputs X.py -- jupyter nbconvert --to script X.ipynb
+
+does the same for a command: it runs only if the input files' contents (or
+the command) changed since it last made the outputs.
+
+Skipped stages are reported on the `log` logger; the command line entry
+points show them on stderr (log_to_stderr()).
+"""
+import os, sys, json, glob, hashlib, logging, argparse, threading, subprocess
+
+import numpy as np
+import pandas as pd
+
+MANIFEST = '.outputs.json'
+LIBRARIES = ['pandas', 'numpy', 'folium', 'branca', 'bokeh', 'matplotlib', 'geopandas', 'shapely', 'topojson']
+
+log = logging.getLogger(__name__)
+
+_code = None
+
+
+class File:
+    """A path whose contents, not its name, go into a digest()."""
+
+    def __init__(self, path):
+        self.path = path
+
+
+def _update(h, obj):
+    from .windows import CaseWindows
+
+    h.update(type(obj).__name__.encode())
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        h.update(repr(obj).encode())
+    elif isinstance(obj, bytes):
+        h.update(obj)
+    elif isinstance(obj, File):
+        with open(obj.path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    elif isinstance(obj, (pd.Timestamp, np.datetime64, np.generic)):
+        h.update(repr(obj).encode())
+    elif isinstance(obj, np.ndarray):
+        h.update(f'{obj.dtype}{obj.shape}'.encode())
+        h.update(np.ascontiguousarray(obj).tobytes() if obj.dtype != object else repr(obj.tolist()).encode())
+    elif isinstance(obj, pd.DataFrame):
+        _update(h, pd.Index(obj.columns))
+        _update(h, obj.index)
+        for column in obj.columns:
+            _update(h, obj[column])
+    elif isinstance(obj, (pd.Series, pd.Index)):
+        h.update(f'{obj.dtype}{obj.name}'.encode())
+        if getattr(obj.dtype, 'name', None) == 'geometry':
+            import shapely
+            _update(h, shapely.to_wkb(np.asarray(obj)))
+        else:
+            h.update(pd.util.hash_pandas_object(obj, index=False).to_numpy().tobytes())
+    elif isinstance(obj, CaseWindows):
+        for part in (obj.key, obj.keys, obj.dates, obj.totals, obj.observed, obj.spans):
+            _update(h, part)
+    elif isinstance(obj, dict):
+        for key in sorted(obj, key=repr):
+            _update(h, key)
+            _update(h, obj[key])
+    elif isinstance(obj, (list, tuple)):
+        h.update(str(len(obj)).encode())
+        for item in obj:
+            _update(h, item)
+    else:
+        raise TypeError(f"don't know how to digest a {type(obj).__name__}")
+
+
+def digest(*objs):
+    """sha256 hex digest of `objs`: frames, arrays, CaseWindows, Files and plain values, nested in lists and dicts."""
+    h = hashlib.sha256()
+    _update(h, objs)
+    return h.hexdigest()
+
+
+def code_version():
+    """Digest of the package source and the rendering libraries' versions."""
+    global _code
+    if _code is None:
+        from importlib import metadata
+
+        def version(name):
+            try:
+                return metadata.version(name)
+            except metadata.PackageNotFoundError:
+                return None
+        here = os.path.dirname(os.path.abspath(__file__))
+        sources = [File(path) for path in sorted(glob.glob(os.path.join(here, '*.py')))]
+        _code = digest(sources, {name: version(name) for name in LIBRARIES})
+    return _code
+
+
+def _paths(result):
+    """The strings in `result` (a path, or lists of them)."""
+    if isinstance(result, str):
+        return [result]
+    if isinstance(result, (list, tuple)):
+        return [path for item in result for path in _paths(item)]
+    return []
+
+
+class Manifest:
+    """{stage: {'key': digest, 'result': what it returned, 'files': other files it made}} kept in a JSON file."""
+
+    def __init__(self, path=MANIFEST):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def fresh(self, name, key):
+        """The recorded result of `name` if it was made with `key` and its files are all still there."""
+        entry = self.entries.get(name)
+        if entry and entry['key'] == key and all(os.path.exists(path) for path in
+                                                 _paths(entry['result']) + entry.get('files', [])):
+            return entry
+        return None
+
+    def record(self, name, key, result, files=()):
+        """Record `result` of `name`, and `files` beyond the paths in it that it made."""
+        with self._lock:
+            self.entries[name] = {'key': key, 'result': result, 'files': list(files)}
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def log_to_stderr():
+    """Show the skipped stages (`log`'s info messages) on stderr."""
+    # a logging handler writes each message whole, even from the pipeline's threads
+    logging.basicConfig(format='%(message)s')
+    log.setLevel(logging.INFO)
+
+
+def cached(manifest, name, func, *extra, inputs=None, files=None, force=False):
+    """`func` skipped when called with the same inputs as the last time `name` ran.
+
+    The key is a digest of the arguments (or of `inputs(*args)`, for arguments
+    that can't be hashed or where only some matter), `extra` and the code
+    version.  `files(result)` names more files the run made, which have to
+    still be there too.  With `force` it always runs, and records the new key.
+    """
+    def run(*args):
+        key = digest(name, code_version(), extra, inputs(*args) if inputs else args)
+        entry = None if force else manifest.fresh(name, key)
+        if entry is not None:
+            log.info("%s: unchanged, skipped", name)
+            return entry['result']
+        result = func(*args)
+        manifest.record(name, key, result, files(result) if files else ())
+        return result
+    return run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--manifest', default=MANIFEST, help="(default: %(default)s)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('exec', help="run a command unless its inputs are as when it last made its outputs")
+    p.add_argument('--name', help="manifest entry (default: the outputs)")
+    p.add_argument('--inputs', nargs='+', default=[], help="files the command reads")
+    p.add_argument('--outputs', nargs='+', required=True, help="files the command writes")
+    p.add_argument('--force', action='store_true')
+    p.add_argument('args', nargs=argparse.REMAINDER, help="the command, after --")
+    args = parser.parse_args(argv)
+    log_to_stderr()
+
+    command = args.args[1:] if args.args[:1] == ['--'] else args.args
+
+    def execute():
+        status = subprocess.call(command)
+        if status:
+            sys.exit(status)
+        return args.outputs
+    # not keyed on the package code: the command isn't ours
+    name = args.name or ' '.join(args.outputs)
+    key = digest(name, command, [File(path) for path in args.inputs])
+    manifest = Manifest(args.manifest)
+    if not args.force and manifest.fresh(name, key):
+        log.info("%s: unchanged, skipped", name)
+        return
+    manifest.record(name, key, execute())
+
+
+if __name__ == '__main__':
+    main()
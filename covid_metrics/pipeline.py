@@ -0,0 +1,214 @@
+"""Single process refresh of everything update.sh publishes.
+
+The refresh is a graph of stages (download -> parse -> windows -> population
+join -> map/plot render -> PNG export).  Each stage is a function of the
+results of the stages it depends on, so the VDH data is loaded and windowed
+once and shared.  Stages whose inputs are ready run concurrently on a thread
+pool, letting the state map, the county maps and the York plots proceed side
+by side, and every stage's wall time is reported at the end and logged as a
+runlog span (with its CPU time and peak RSS).
+
+    python -m covid_metrics.pipeline
+"""
+import os, sys, time, argparse
+import concurrent.futures
+
+from . import DOCS, runlog
+
+
+class Pipeline:
+    def __init__(self):
+        self.stages = {}  # name -> (func, deps)
+        self.closing = []  # stages whose result is close()d after the run
+        self.results = {}
+        self.timings = {}  # name -> (start, seconds), relative to the run start
+
+    def add(self, name, func, *deps, closing=False):
+        """Add stage `name`, called as func(*[result of each dep]).
+
+        With `closing=True` the result (say a pool of browsers) is closed once
+        the run is over.
+        """
+        self.stages[name] = (func, deps)
+        if closing:
+            self.closing.append(name)
+
+    def needed(self, targets):
+        """`targets` and every stage they depend on."""
+        need, todo = set(), list(targets)
+        while todo:
+            name = todo.pop()
+            if name not in need:
+                need.add(name)
+                todo.extend(self.stages[name][1])
+        return need
+
+    def run(self, targets=None, workers=4):
+        """Run `targets` (default everything) and their dependencies; returns the results."""
+        names = self.needed(targets) if targets else set(self.stages)
+        pending = {name: self.stages[name] for name in names}
+        results, timings, running = {}, {}, {}
+        t0 = time.perf_counter()
+
+        def timed(name, func, args):
+            start = time.perf_counter()
+            with runlog.span(name, parent='pipeline'):
+                result = func(*args)
+            return result, (start - t0, time.perf_counter() - start)
+
+        try:
+            with runlog.span('pipeline'), concurrent.futures.ThreadPoolExecutor(workers) as pool:
+                while pending or running:
+                    for name, (func, deps) in list(pending.items()):
+                        if all(d in results for d in deps):
+                            running[pool.submit(timed, name, func, [results[d] for d in deps])] = name
+                            del pending[name]
+                    if not running:
+                        raise ValueError(f"stages with unknown dependencies: {sorted(pending)}")
+                    done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        results[name], timings[name] = future.result()
+        finally:
+            for name in self.closing:
+                if name in results:
+                    results[name].close()
+
+        self.results, self.timings = results, timings
+        self.wall = time.perf_counter() - t0
+        return results
+
+    def report(self, file=sys.stdout):
+        for name, (start, seconds) in sorted(self.timings.items(), key=lambda kv: kv[1][0]):
+            print(f"{name:20s} {start:8.2f}s +{seconds:7.2f}s", file=file)
+        print(f"{'total':20s} {self.wall:8.2f}s", file=file)
+
+
+PNG_MODES = ('static', 'browser')
+
+
+def build(docs=DOCS, day=None, doi=None, loi='York', png='static', localities=False, national=None, force=False):
+    """The full update.sh refresh as a Pipeline.
+
+    `day` is the VDH report date for the county maps (MM/DD/YYYY), `doi` the
+    CDC date for the state map (YYYYMMDD); both default to the latest date
+    every locality or state is in, from the feeds' snapshots.Store.
+    `png` is 'static' to draw the PNGs with matplotlib straight from the data,
+    'browser' to screenshot the HTML pages in headless Chrome, or None for no PNGs.
+    `localities` adds the plots of every locality (locality.save_all) as stage 'locality_all'.
+    `national` names a sources.SOURCES feed to also map every US county from (stages us_*).
+
+    The stages writing maps, plots and PNGs are skipped when their inputs hash
+    as in their last run (see outputs.Manifest, kept in `docs`), unless `force`.
+    """
+    from . import vdh, windows, population, counties, states, locality, screenshots, render, timelapse, sources, outputs, geometry, national as us
+
+    p = Pipeline()
+    manifest = outputs.Manifest(os.path.join(docs, outputs.MANIFEST))
+
+    def output(name, func, *deps, inputs=None, files=None):
+        p.add(name, outputs.cached(manifest, name, func, docs, inputs=inputs, files=files, force=force), *deps)
+
+    def plots(dfy):
+        return locality.plot_7day(dfy, loi), locality.plot_per_day(dfy, loi)
+
+    # Virginia: one download, parse and FIPS x date window pass shared by the county maps and the York plots
+    p.add('vdh_download', vdh.download)
+    p.add('vdh_cases', lambda fetched: vdh.load_cases(), 'vdh_download')
+    p.add('vdh_windows', lambda df: windows.CaseWindows.from_frame(df, key='FIPS'), 'vdh_cases')
+    # each report date kept as published; the maps default to the latest one every locality is in
+    vdh_store = sources.SOURCES['vdh'].snapshots()
+    p.add('vdh_snapshots', vdh_store.update, 'vdh_cases', 'vdh_windows')
+    p.add('county_day', lambda new: day or counties.default_day(vdh_store), 'vdh_snapshots')
+
+    # one FIPS keyed population table behind the county, locality and state populations
+    p.add('population', population.load)
+
+    p.add('county_population', counties.load_population, 'population')
+    p.add('county_geometry', counties.load_geometry)
+    p.add('county_metrics', counties.county_metrics, 'vdh_cases', 'vdh_windows', 'county_population', 'county_day')
+    p.add('county_join', counties.join_geometry, 'county_geometry', 'county_metrics')
+    # the map pages also need the outlines and tables they load from docs/assets
+    output('county_maps', lambda x: counties.save_maps(x, docs, workers=os.cpu_count()), 'county_join', files=geometry.assets)
+    output('county_timelapse', lambda df, cw, pop, shapes: timelapse.save_map(df, cw, pop, shapes, docs),
+           'vdh_cases', 'vdh_windows', 'county_population', 'county_geometry')
+
+    p.add('locality_popxls', locality.load_population, 'population')
+    p.add('locality_population', lambda popxls, df: locality.locality_population(popxls, loi, df),
+          'locality_popxls', 'vdh_cases')
+    p.add('locality_series', lambda df, cw, pop: locality.locality_series(df, cw, loi, pop),
+          'vdh_cases', 'vdh_windows', 'locality_population')
+    # the figures are drawn inside the output stages, so an unchanged series costs nothing
+    output('locality_html', lambda dfy: locality.save_plots(*plots(dfy), docs=docs), 'locality_series')
+    output('locality_explorer', lambda df, cw, popxls: locality.save_explorer(locality.explorer(df, cw, popxls, loi), docs),
+           'vdh_cases', 'vdh_windows', 'locality_popxls')
+    if localities:
+        # static PNGs are drawn in the same worker processes; browser screenshots of 266 pages aren't worth it
+        output('locality_all', lambda df, cw, popxls: locality.save_all(df, cw, popxls, docs, png=png == 'static'),
+               'vdh_cases', 'vdh_windows', 'locality_popxls')
+
+    if national:
+        # every US county: same metrics and maps, from a national feed
+        source = sources.SOURCES[national]
+        p.add('us_download', source.download)
+        p.add('us_cases', lambda fetched: source.load(), 'us_download')
+        p.add('us_windows', source.windows, 'us_cases')
+        p.add('us_snapshots', source.snapshots().update, 'us_cases', 'us_windows')
+        p.add('us_population', lambda index: counties.load_population(index, state=None), 'population')
+        p.add('us_geometry', lambda: counties.load_geometry(state=None))
+        p.add('us_metrics', lambda df, cw, pop, new: counties.county_metrics(df, cw, pop, source.default_day(df)),
+              'us_cases', 'us_windows', 'us_population', 'us_snapshots')
+        p.add('us_join', counties.join_geometry, 'us_geometry', 'us_metrics')
+        output('us_maps', lambda x: us.save_maps(x, docs, workers=os.cpu_count()), 'us_join', files=geometry.assets)
+
+    # US states from the CDC testing data
+    p.add('state_geometry', states.load_geometry)
+    p.add('state_population', states.load_population, 'population')
+    p.add('state_download', states.download)
+    p.add('state_cases', lambda fetched: states.load_cases(), 'state_download')
+    p.add('state_windows', states.state_windows, 'state_cases')
+    cdc_store = states.snapshots_store()
+    p.add('state_snapshots', cdc_store.update, 'state_cases', 'state_windows')
+    p.add('state_day', lambda new: doi or states.default_day(cdc_store), 'state_snapshots')
+    p.add('state_metrics', states.state_metrics, 'state_cases', 'state_windows', 'state_population', 'state_day')
+    p.add('state_join', states.join_geometry, 'state_geometry', 'state_metrics')
+    output('state_map', lambda gjson, d: states.save_map(d, docs=docs), 'state_join', 'state_day', files=geometry.assets)
+
+    if png == 'static':
+        # drawn from the joined data, so no browser and no waiting on the HTML pages
+        output('county_png', lambda x: render.county_pngs(x, docs), 'county_join')
+        output('state_png', lambda gjson, d: render.state_png(gjson, d, docs), 'state_join', 'state_day')
+        output('locality_png', lambda dfy: render.locality_pngs(dfy, loi, docs), 'locality_series')
+    elif png == 'browser':
+        # one pool of headless browsers, started alongside the data loading, shared by every PNG
+        p.add('browser_pool', lambda: screenshots.BrowserPool().warm(), closing=True)
+        output('locality_png', lambda dfy, pool: locality.export_pngs(*plots(dfy), docs=docs, pool=pool),
+               'locality_series', 'browser_pool', inputs=lambda dfy, pool: dfy)
+        # the pages are screenshot again only if they were written again
+        output('map_png', lambda county, state, pool: pool.screenshot_all(county + [state]),
+               'county_maps', 'state_map', 'browser_pool',
+               inputs=lambda county, state, pool: [outputs.File(path) for path in county + [state]])
+    return p
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('targets', nargs='*', help="stages to run (default: all)")
+    parser.add_argument('--docs', default=DOCS)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--png', choices=PNG_MODES, default='static', help="how PNGs are made (default: %(default)s)")
+    parser.add_argument('--no-png', dest='png', action='store_const', const=None, help="skip the PNG exports")
+    parser.add_argument('--all-localities', action='store_true', help="also plot every Virginia locality")
+    parser.add_argument('--national', choices=['nyt'], help="also map every US county from this feed")
+    parser.add_argument('--force', action='store_true', help="redraw every output, changed or not")
+    args = parser.parse_args(argv)
+    from . import outputs
+    outputs.log_to_stderr()
+
+    p = build(docs=args.docs, png=args.png, localities=args.all_localities, national=args.national, force=args.force)
+    p.run(args.targets or None, workers=args.workers)
+    p.report()
+
+
+if __name__ == '__main__':
+    main()
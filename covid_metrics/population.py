@@ -0,0 +1,114 @@
+"""One population table keyed by FIPS, for states and counties alike.
+
+The three notebooks each read their own population source every run: the
+national census county estimates (latin-1 CSV, ~3200 counties to keep ~133),
+the census state estimates joined to 2-letter codes through a remote FIPS
+master, and VDH's 2018 Pop.xls.  `load` merges them once into a small Parquet
+index next to the downloads, rebuilt only when a source file is newer than it.
+
+Rows are keyed by FIPS as a number, state * 1000 + county, with county 0 for a
+state (and 0 for the whole US), so a Virginia locality's VDH FIPS and the
+state's 51000 sit in the same index.  Columns:
+
+    state   2-letter code
+    name    census county or state name
+    census  2019 census estimate (POPESTIMATE2019)
+    vdh     VDH 2018 population, Virginia localities (and Virginia) only
+    locality  the VDH Pop.xls name
+"""
+import os, threading
+
+import pandas as pd
+
+from . import DOWNLOADS, fetch
+
+# https://www2.census.gov/programs-surveys/popest/datasets/2010-2019/counties/totals/
+COEST_FILE = os.path.join(DOWNLOADS, 'co-est2019-alldata.csv')
+COEST_URL = 'https://www2.census.gov/programs-surveys/popest/datasets/2010-2019/counties/totals/co-est2019-alldata.csv'
+
+# https://www2.census.gov/programs-surveys/popest/datasets/2010-2019/state/detail/
+STATE_FILE = os.path.join(DOWNLOADS, 'SCPRC-EST2019-18+POP-RES.csv')
+STATE_URL = 'https://www2.census.gov/programs-surveys/popest/datasets/2010-2019/state/detail/SCPRC-EST2019-18+POP-RES.csv'
+
+# https://apps.vdh.virginia.gov/HealthStats/stats.htm
+VDH_XLS = os.path.join(DOWNLOADS, '2018 Pop.xls')
+VDH_URL = 'https://apps.vdh.virginia.gov/HealthStats/documents/xls/2018%20Pop.xls'
+
+INDEX_FILE = os.path.join(DOWNLOADS, 'population.parquet')
+
+# state FIPS -> USPS code, as in https://github.com/kjhealy/fips-codes/blob/master/state_fips_master.csv
+STATE_ABBR = {
+    0: 'US', 1: 'AL', 2: 'AK', 4: 'AZ', 5: 'AR', 6: 'CA', 8: 'CO', 9: 'CT', 10: 'DE', 11: 'DC',
+    12: 'FL', 13: 'GA', 15: 'HI', 16: 'ID', 17: 'IL', 18: 'IN', 19: 'IA', 20: 'KS', 21: 'KY',
+    22: 'LA', 23: 'ME', 24: 'MD', 25: 'MA', 26: 'MI', 27: 'MN', 28: 'MS', 29: 'MO', 30: 'MT',
+    31: 'NE', 32: 'NV', 33: 'NH', 34: 'NJ', 35: 'NM', 36: 'NY', 37: 'NC', 38: 'ND', 39: 'OH',
+    40: 'OK', 41: 'OR', 42: 'PA', 44: 'RI', 45: 'SC', 46: 'SD', 47: 'TN', 48: 'TX', 49: 'UT',
+    50: 'VT', 51: 'VA', 53: 'WA', 54: 'WV', 55: 'WI', 56: 'WY', 72: 'PR',
+}
+
+_lock = threading.Lock()  # the pipeline loads it from several stages at once
+
+
+def _counties(path):
+    coest = pd.read_csv(path, encoding='latin-1', usecols=['SUMLEV', 'STATE', 'COUNTY', 'CTYNAME', 'POPESTIMATE2019'])
+    coest = coest[coest['SUMLEV'] == 50]
+    return pd.DataFrame({'name': coest['CTYNAME'].to_numpy(), 'census': coest['POPESTIMATE2019'].to_numpy()},
+                        index=coest['STATE'] * 1000 + coest['COUNTY'])
+
+
+def _states(path):
+    pops = pd.read_csv(path, usecols=['STATE', 'NAME', 'POPESTIMATE2019'])
+    return pd.DataFrame({'name': pops['NAME'].to_numpy(), 'census': pops['POPESTIMATE2019'].to_numpy()},
+                        index=pops['STATE'] * 1000)
+
+
+def _vdh(path):
+    popxls = pd.read_excel(path, header=[3])
+    popxls = popxls[popxls['Population'].notna()]
+    # the rows without a Code (Virginia's total) are the state's
+    fips = 51000 + popxls['Code'].fillna(0).astype(int)
+    out = pd.DataFrame({'vdh': popxls['Population'].to_numpy(dtype=float),
+                        'locality': popxls['Locality'].astype(str).str.strip().to_numpy()}, index=fips)
+    return out[~out.index.duplicated()]
+
+
+def build(coest_file=COEST_FILE, state_file=STATE_FILE, vdh_file=VDH_XLS):
+    index = pd.concat([_states(state_file), _counties(coest_file)])
+    index = index[~index.index.duplicated()].join(_vdh(vdh_file), how='outer')
+    index.index = index.index.astype('int32').rename('FIPS')
+    index['state'] = pd.Categorical((index.index // 1000).map(STATE_ABBR))
+    index['census'] = index['census'].astype('Int64')
+    return index[['state', 'name', 'census', 'vdh', 'locality']].sort_index()
+
+
+def load(coest_file=COEST_FILE, state_file=STATE_FILE, vdh_file=VDH_XLS, path=INDEX_FILE, rebuild=False):
+    """The FIPS indexed population table, from the cache at `path` unless a source is newer.
+
+    Missing sources are downloaded first; the ones on disk are never re-fetched.
+    """
+    with _lock:
+        sources = {coest_file: COEST_URL, state_file: STATE_URL, vdh_file: VDH_URL}
+        for source, url in sources.items():
+            fetch.fetch(url, source, max_age=None)
+        if not rebuild and os.path.exists(path) and \
+                os.path.getmtime(path) >= max(os.path.getmtime(source) for source in sources):
+            return pd.read_parquet(path)
+
+        index = build(coest_file, state_file, vdh_file)
+        tmp = path + '.tmp'
+        index.to_parquet(tmp)
+        os.replace(tmp, path)
+        return index
+
+
+def states(index):
+    """The state rows (and the US total)."""
+    return index[index.index % 1000 == 0]
+
+
+def counties(index, state=None):
+    """The county rows, of one state (by FIPS number) if given."""
+    rows = index.index % 1000 != 0
+    if state is not None:
+        rows &= index.index // 1000 == int(state)
+    return index[rows]
@@ -0,0 +1,152 @@
+"""Static PNGs of the maps and plots, drawn with matplotlib instead of a browser.
+
+Screenshotting the folium pages and bokeh.io.export_png both need a real
+browser and driver.  This draws the same pictures straight from the data: the
+choropleths from the joined GeoDataFrames (`x` for the counties, `gjson` for
+the states) with the same branca colormaps the folium maps use, and the
+locality time series from `dfy` with the same bands and lines as the bokeh
+plots.  Only the Agg canvas is used, so it is thread safe and needs no display.
+"""
+import os, re
+
+import numpy as np
+
+from . import DOCS, colormaps
+
+SOURCE = "Code: https://github.com/drf5n/YCSD_covid_metrics"
+
+# folium's map views, as (lon min, lon max, lat min, lat max)
+VIRGINIA = (-83.8, -75.1, 36.4, 39.6)
+LOWER_48 = (-125, -66, 24, 50)
+
+
+def _figure(size):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=size)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _text(html):
+    return ' '.join(re.sub('<[^>]+>', '', html).split())
+
+
+def _paths(geoms):
+    """matplotlib Paths (holes included) for shapely (Multi)Polygons."""
+    from matplotlib.path import Path
+    from shapely.geometry.polygon import orient
+
+    for geom in geoms:
+        rings = []
+        for poly in getattr(geom, 'geoms', [geom]):
+            poly = orient(poly)  # exterior ccw, holes cw, so holes stay empty under either fill rule
+            rings.append(Path(np.asarray(poly.exterior.coords)[:, :2], closed=True))
+            rings.extend(Path(np.asarray(ring.coords)[:, :2], closed=True) for ring in poly.interiors)
+        yield Path.make_compound_path(*rings)
+
+
+def _cmap(colorscale):
+    """A matplotlib colormap + norm equivalent to a branca LinearColormap."""
+    from matplotlib.colors import LinearSegmentedColormap, Normalize
+
+    lo, hi = colorscale.vmin, colorscale.vmax
+    stops = [(min(max((i - lo) / (hi - lo), 0), 1), c) for i, c in zip(colorscale.index, colorscale.colors)]
+    return LinearSegmentedColormap.from_list('branca', stops), Normalize(lo, hi)
+
+
+def choropleth(gdf, metric, colorscale, path, title='', subtitle='', extent=None, size=(8, 6), dpi=100):
+    """Fill each feature of `gdf` by `colorscale(gdf[metric])` and save a PNG to `path`."""
+    from matplotlib.collections import PathCollection
+    from matplotlib.cm import ScalarMappable
+
+    gdf = gdf[gdf.geometry.notna()]
+    values = gdf[metric].to_numpy(dtype=float)
+    known = ~np.isnan(values)
+    cmap, norm = _cmap(colorscale)
+
+    fig = _figure(size)
+    ax = fig.add_axes([0.02, 0.12, 0.96, 0.76])
+    paths = list(_paths(gdf.geometry))
+    colors = np.zeros((len(paths), 4))
+    colors[known] = colormaps.rgba(colorscale, values[known])  # exactly the folium map's colours
+    colors[:, 3] = np.where(known, 0.5, 0)  # folium's fillOpacity, nothing for features without data
+    ax.add_collection(PathCollection(paths, facecolors=colors, edgecolors='#666666', linewidths=0.2))
+
+    if extent is None:
+        extent = gdf[known].total_bounds[[0, 2, 1, 3]]
+    ax.set_xlim(extent[0], extent[1])
+    ax.set_ylim(extent[2], extent[3])
+    ax.set_aspect(1 / np.cos(np.radians((extent[2] + extent[3]) / 2)))
+    ax.set_axis_off()
+
+    fig.text(0.5, 0.96, _text(title), ha='center', va='top', fontsize=10, fontweight='bold', wrap=True)
+    fig.text(0.5, 0.91, _text(subtitle), ha='center', va='top', fontsize=8)
+    cax = fig.add_axes([0.25, 0.07, 0.5, 0.025])
+    fig.colorbar(ScalarMappable(norm, cmap), cax=cax, orientation='horizontal').set_label(colorscale.caption, fontsize=8)
+    fig.text(0.01, 0.01, SOURCE, fontsize=7, style='italic')
+    fig.savefig(path, dpi=dpi)
+    return path
+
+
+def county_pngs(x, docs=DOCS, names=None):
+    """docs/<name>.png for each of counties.MAPS, from the joined county GeoDataFrame `x`."""
+    from . import counties
+
+    colorscales = counties.colorscales()
+    paths = []
+    for name in names or counties.MAPS:
+        spec = counties.MAPS[name]
+        paths.append(choropleth(x, spec['metric'], colorscales[spec['span']],
+                                os.path.join(docs, name + '.png'),
+                                spec['title'], spec['subtitle'], extent=VIRGINIA))
+    return paths
+
+
+def state_png(gjson, doi, docs=DOCS):
+    from . import states
+
+    path = os.path.join(docs, states.MAP_FILE.replace('.html', '.png'))
+    return choropleth(gjson, 'per100k_28daysum', states.colorscale(), path,
+                      f"{doi} US States COVID risk per CDC Foreign Travel and School/Community Risk Categories",
+                      """(Red is CDC Level 4: >500cases/28days/100k, Very High, Avoid all travel" and Black is 10x higher)""",
+                      extent=LOWER_48)
+
+
+def _series(ax, dfy, bands, vmax):
+    for bottom, top, color, alpha in bands:
+        ax.axhspan(bottom, vmax if top is None else top, color=color, alpha=alpha, linewidth=0)
+    ax.set_ylim(0, vmax)
+    ax.set_xlim(dfy['date'].min(), dfy['date'].max())
+    ax.grid(alpha=0.3)
+
+
+def locality_pngs(dfy, loi, docs=DOCS, prefix='YorkCountyCovidMetric', size=(6, 6), dpi=100):
+    """The 7 day and per day plots of `dfy` as docs/<prefix>_plot.png and _per_day_plot.png."""
+    from . import locality
+
+    paths = [os.path.join(docs, prefix + '_plot.png'), os.path.join(docs, prefix + '_per_day_plot.png')]
+
+    fig = _figure(size)
+    ax = fig.add_subplot()
+    vmax = locality.vmax_7day(dfy)
+    _series(ax, dfy, locality.BANDS_7DAY, vmax)
+    ax.plot(dfy['date'], dfy['per100k_7daysum'], color='#1f77b4')
+    ax.set_title(locality.TITLE_7DAY.format(loi), fontsize=9, loc='left')
+    fig.text(0.01, 0.01, SOURCE, fontsize=7, style='italic')
+    fig.autofmt_xdate()
+    fig.savefig(paths[0], dpi=dpi)
+
+    fig = _figure(size)
+    ax = fig.add_subplot()
+    _series(ax, dfy, locality.BANDS_PER_DAY, vmax / 7)
+    ax.scatter(dfy['date'], dfy['per100k_1daymean'], s=4, color='black', label="Daily")
+    for column, color, legend, width in locality.LINES_PER_DAY:
+        ax.plot(dfy['date'], dfy[column], color=color, label=legend, linewidth=width)
+    ax.legend(loc='upper left', fontsize=8)
+    ax.set_title(locality.TITLE_PER_DAY.format(loi), fontsize=9, loc='left')
+    fig.text(0.01, 0.01, SOURCE, fontsize=7, style='italic')
+    fig.autofmt_xdate()
+    fig.savefig(paths[1], dpi=dpi)
+    return paths
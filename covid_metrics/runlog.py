@@ -0,0 +1,171 @@
+"""Per stage wall time, CPU time and peak RSS, appended to a JSON-lines run log.
+
+    from covid_metrics import runlog
+
+    with runlog.span('vdh_load'):
+        df = vdh.load_cases()
+
+writes one line per span to RUNLOG (runlog.jsonl, or $COVID_METRICS_RUNLOG):
+
+    {"run": "20220118T061502-4242", "script": "update.sh", "span": "vdh_load", "parent": "pipeline",
+     "start": 1642486502.1, "wall": 1.31, "cpu": 1.29, "max_rss": 254000000, "status": "ok"}
+
+`cpu` is the CPU time of the thread the span ran on (so stages running side
+by side on the pipeline's threads don't count each other), `max_rss` the
+process' peak RSS when the span ended.  Every span of a process shares one
+run id; a run id already in $COVID_METRICS_RUN is used instead, so the
+steps of update.sh and the processes they start are logged as one run.
+
+`exec` times a whole command (its CPU and peak RSS are the child's), and
+`summary` compares the latest run with the runs before it:
+
+    python -m covid_metrics.runlog exec nbconvert -- jupyter nbconvert --to script X.ipynb
+    python -m covid_metrics.runlog summary --runs 5 [--script update.sh]
+"""
+import os, sys, json, time, argparse, resource, threading, contextlib, statistics, subprocess
+
+RUNLOG = os.environ.get('COVID_METRICS_RUNLOG', 'runlog.jsonl')
+RUN_ENV = 'COVID_METRICS_RUN'
+SCRIPT_ENV = 'COVID_METRICS_SCRIPT'
+PARENT_ENV = 'COVID_METRICS_SPAN'  # the span a child process was started from
+RUNS = 5  # previous runs summary() compares with
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+def run_id():
+    """This run's id, made up (and exported to child processes) on first use."""
+    if RUN_ENV not in os.environ:
+        os.environ[RUN_ENV] = time.strftime('%Y%m%dT%H%M%S') + f'-{os.getpid()}'
+    return os.environ[RUN_ENV]
+
+
+def script():
+    return os.environ.get(SCRIPT_ENV) or os.path.basename(sys.argv[0]) or 'python'
+
+
+def _max_rss(who=resource.RUSAGE_SELF):
+    rss = resource.getrusage(who).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # bytes on macOS, KiB on Linux
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def write(record, log=None):
+    """Append `record` as one line of the run log."""
+    line = json.dumps(record) + '\n'
+    with _lock, open(log or RUNLOG, 'a') as f:
+        f.write(line)
+
+
+@contextlib.contextmanager
+def span(name, parent=None, children=False, log=None, **attrs):
+    """Time the body as span `name`; yields its record, to which more attributes can be added.
+
+    Spans nest within a thread; `parent` names the enclosing span for one
+    started on another thread.  With `children` the CPU time and peak RSS
+    are those of the child processes waited for in the body (see run()).
+    """
+    stack = _local.__dict__.setdefault('stack', [])
+    parent = parent or (stack[-1] if stack else os.environ.get(PARENT_ENV))
+    record = dict(run=run_id(), script=script(), span=name, parent=parent, pid=os.getpid(), start=time.time(), **attrs)
+    cpu = _children_cpu() if children else time.thread_time()
+    wall = time.perf_counter()
+    stack.append(name)
+    try:
+        yield record
+        record['status'] = 'ok'
+    except BaseException as e:
+        record['status'] = type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        record['wall'] = round(time.perf_counter() - wall, 4)
+        record['cpu'] = round((_children_cpu() if children else time.thread_time()) - cpu, 4)
+        record['max_rss'] = _max_rss(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+        write(record, log)
+
+
+def run(name, args, log=None):
+    """Run command `args` as span `name`; returns its exit status."""
+    with span(name, children=True, log=log, command=' '.join(args)) as record:
+        status = subprocess.call(args, env=dict(os.environ, **{RUN_ENV: run_id(), PARENT_ENV: name}))
+        record['returncode'] = status
+    return status
+
+
+def read(log=None):
+    """Every record in the run log, in the order written."""
+    if not os.path.exists(log or RUNLOG):
+        return []
+    with open(log or RUNLOG) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def runs(records):
+    """{run id: its records}, oldest run first."""
+    out = {}
+    for r in sorted(records, key=lambda r: r['start']):
+        out.setdefault(r['run'], []).append(r)
+    return out
+
+
+def totals(records):
+    """{span: (wall, cpu, max_rss)}, repeats of a span summed (peak RSS the largest)."""
+    out = {}
+    for r in records:
+        wall, cpu, rss = out.get(r['span'], (0, 0, 0))
+        out[r['span']] = (wall + r['wall'], cpu + r['cpu'], max(rss, r['max_rss']))
+    return out
+
+
+def summary(log=None, previous=RUNS, script=None, file=sys.stdout):
+    """Print the latest run's spans (of `script`, if given) next to the median of up to `previous`
+    earlier runs of the same script."""
+    by_run = {run: rs for run, rs in runs(read(log)).items() if script in (None, rs[0]['script'])}
+    if not by_run:
+        print(f"no runs in {log or RUNLOG}", file=file)
+        return
+    latest_id, latest = list(by_run.items())[-1]
+    name = latest[0]['script']
+    earlier = [totals(rs) for run, rs in by_run.items() if run != latest_id and rs[0]['script'] == name][-previous:]
+    failed = [r['span'] for r in latest if r['status'] != 'ok']
+
+    print(f"run {latest_id} ({name}) vs the median of {len(earlier)} earlier run(s)"
+          + (f", failed: {', '.join(failed)}" if failed else ''), file=file)
+    print(f"{'span':24s} {'wall s':>8} {'cpu s':>8} {'rss MB':>8} {'median s':>9} {'ratio':>6}", file=file)
+    for span_name, (wall, cpu, rss) in totals(latest).items():
+        before = [t[span_name][0] for t in earlier if span_name in t]
+        if before:
+            median = statistics.median(before)
+            compared = f"{median:9.2f} {wall / median if median else float('inf'):6.2f}"
+        else:
+            compared = f"{'-':>9} {'-':>6}"
+        print(f"{span_name:24s} {wall:8.2f} {cpu:8.2f} {rss / 2**20:8.0f} {compared}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--log', default=RUNLOG, help="run log (default: %(default)s)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('summary', help="the latest run against the ones before it")
+    p.add_argument('--runs', type=int, default=RUNS, help="earlier runs to compare with (default: %(default)s)")
+    p.add_argument('--script', help="the latest run of this script (update.sh, pipeline.py, ...)")
+    p = sub.add_parser('exec', help="run a command as one span")
+    p.add_argument('name')
+    p.add_argument('args', nargs=argparse.REMAINDER, help="the command, after --")
+    args = parser.parse_args(argv)
+
+    if args.command == 'summary':
+        summary(args.log, args.runs, args.script)
+    else:
+        command = args.args[1:] if args.args[:1] == ['--'] else args.args
+        sys.exit(run(args.name, command, args.log))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Named CDC risk level schemes, applied to every key and day at once.
+
+Each Scheme is a set of per 100k thresholds on one n-day case window with a
+label per level.  Levels are stored as small integer codes (-1 where there is
+no rate) that index the scheme's labels, so a whole locality x day history is
+one int8 array per scheme and `label_table()` is the only place the text lives.
+Thresholds are upper bounds, inclusive, as with the pd.cut bins they replace,
+and so are the outer BOUNDS of those bins: a rate of -1 or less (a negative
+sum after corrections) or over 50000 has no level, as pd.cut gave NaN.
+"""
+import numpy as np
+import pandas as pd
+
+# (lowest, highest] rate with a level: the outer edges of the notebooks' pd.cut bins
+BOUNDS = (-1, 50000)
+
+
+class Scheme:
+    def __init__(self, name, span, edges, labels, url='', bounds=BOUNDS):
+        """`edges` are the len(labels) - 1 inner thresholds on the `span`-day cases per 100k,
+        `bounds` the (exclusive, inclusive) outer ones."""
+        assert len(edges) == len(labels) - 1
+        self.name = name
+        self.span = span
+        self.edges = np.asarray(edges, dtype=float)
+        self.labels = list(labels)
+        self.url = url
+        self.bounds = bounds
+
+    def codes(self, rates):
+        """int8 level of each rate in `rates` (any shape), -1 for NaN or outside `bounds`."""
+        rates = np.asarray(rates, dtype=float)
+        codes = np.searchsorted(self.edges, rates, side='left').astype(np.int8)
+        low, high = self.bounds
+        codes[np.isnan(rates) | (rates <= low) | (rates > high)] = -1
+        return codes
+
+    def categorical(self, rates):
+        return pd.Categorical.from_codes(self.codes(rates), categories=self.labels)
+
+    def label(self, rates):
+        """The level names of `rates` as strings (NaN, not 'nan', without a level), like pd.cut(...).astype(str)."""
+        return np.asarray(self.categorical(rates).astype(str))
+
+
+SCHEMES = {s.name: s for s in [
+    Scheme('foreign', 28, [50, 100, 500], [
+        #'Level 1, Low:  All travelers should wear a mask, stay at least 6 feet from people who are not from your household, wash your hands often or use hand sanitizer, and watch your health for signs of illness.',
+        'Level 1, Low:  All travelers should wear a mask,...',
+        'Level 2, Moderate: Travelers at increased risk for severe illness from COVID-19 should avoid all nonessential travel.',
+        'Level 3, High: Travelers should avoid all nonessential travel',
+        'Level 4, Very High: Travelers should avoid all travel',
+    ], 'https://www.cdc.gov/coronavirus/2019-ncov/travelers/map-and-travel-notices.html'),
+    # VDH's school metrics, 14 day window
+    Scheme('oldschool', 14, [5, 20, 50, 200], [
+        'Lowest risk of transmission in schools',
+        'Lower risk of transmission in schools',
+        'Moderate risk of transmission in schools',
+        'Higher risk of transmission in schools',
+        'Highest risk of transmission in schools',
+    ], 'https://www.vdh.virginia.gov/coronavirus/key-measures/pandemic-metrics/school-metrics/'),
+    Scheme('school', 7, [10, 25, 100], [
+        'Low risk of transmission',
+        'Moderate risk of transmission',
+        'Substantial risk of transmission',
+        'High risk of transmission',
+    ], 'https://www.cdc.gov/coronavirus/2019-ncov/community/schools-childcare/indicators.html#interpretation'),
+    # the K-12 guidance levels the state map uses
+    Scheme('k12', 7, [10, 50, 100], [
+        'Lower risk of transmission',
+        'Moderate risk of transmission',
+        'Higher risk of transmission',
+        'Highest risk of transmission',
+    ], 'https://www.cdc.gov/coronavirus/2019-ncov/community/schools-childcare/k-12-guidance.html'),
+    # CDC community levels from 2022-02-25.  Hospital admissions and staffed beds,
+    # which aren't in the case feeds, pick the level within each case band:
+    # under 200 cases/7days/100k it is Low unless they are high, over it at least Medium.
+    Scheme('community2022', 7, [200], [
+        'Low, unless hospital metrics are high',
+        'Medium or High',
+    ], 'https://www.cdc.gov/coronavirus/2019-ncov/science/community-levels.html'),
+]}
+
+
+def label_table(names=tuple(SCHEMES)):
+    """(scheme, code) -> label for every level of `names`."""
+    rows = [(name, code, label) for name in names for code, label in enumerate(SCHEMES[name].labels)]
+    return pd.DataFrame(rows, columns=['scheme', 'code', 'label']).set_index(['scheme', 'code'])
+
+
+class Levels:
+    """Level codes of every scheme for every key and day of a `windows.CaseWindows`.
+
+    `codes[name][k, d]` is the level of `cw.keys[k]` on `cw.dates[d]` under
+    SCHEMES[name], computed for the whole history in one pass per scheme.
+    """
+
+    def __init__(self, cw, pop, names=tuple(SCHEMES)):
+        rates = cw.per100k(pop)
+        self.key = cw.key
+        self.keys, self.dates = cw.keys, cw.dates
+        self.codes = {name: SCHEMES[name].codes(rates[:, cw.spans.index(SCHEMES[name].span), :])
+                      for name in names}
+
+    def _frame(self, rows, cols, labels):
+        k, d = np.meshgrid(np.arange(len(self.keys))[rows], np.arange(len(self.dates))[cols], indexing='ij')
+        out = pd.DataFrame({self.key: self.keys[k.ravel()], 'date': self.dates[d.ravel()]})
+        for name, codes in self.codes.items():
+            c = codes[k.ravel(), d.ravel()]
+            out[name] = pd.Categorical.from_codes(c, categories=SCHEMES[name].labels) if labels else c
+        return out
+
+    def on(self, date, labels=True):
+        """Every key's levels on `date`."""
+        return self._frame(slice(None), self.dates == pd.Timestamp(date), labels)
+
+    def series(self, key, labels=True):
+        """One key's levels for every day."""
+        return self._frame(self.keys == key, slice(None), labels)
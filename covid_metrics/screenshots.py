@@ -0,0 +1,146 @@
+"""PNG screenshots of the folium map pages and bokeh plots for the README.
+
+A BrowserPool keeps a few headless Chrome sessions open for the whole run and
+hands them out to whoever needs one: the map pages are screenshotted in
+parallel, and bokeh.io.export_png is given a pooled session instead of
+starting its own driver.  Rather than sleeping a fixed time per page, each
+screenshot is taken as soon as the page reports that Leaflet or Bokeh has
+finished rendering.
+"""
+import os, sys, glob, queue, threading, contextlib
+import concurrent.futures
+
+from . import DOCS
+
+# try this if webdriver errors:
+# webdrivermanager chrome
+CHROMEDRIVER = '/Users/drf/Library/Application Support/WebDriverManager/bin/chromedriver'
+
+# true once the page is loaded and whatever draws it has settled:
+# bokeh documents report is_idle, leaflet has drawn its overlays and its tiles have loaded and faded in
+RENDERED_JS = """
+if (document.readyState !== 'complete') return false;
+if (window.Bokeh !== undefined) {
+    const docs = window.Bokeh.documents;
+    return docs.length > 0 && docs.every((doc) => doc.is_idle);
+}
+if (document.querySelector('.leaflet-container') !== null) {
+    const tiles = Array.from(document.querySelectorAll('img.leaflet-tile'));
+    return document.querySelector('.leaflet-overlay-pane path') !== null
+        && tiles.every((t) => t.complete && getComputedStyle(t).opacity === '1');
+}
+return true;
+"""
+
+
+def start_browser(chromedriver=CHROMEDRIVER):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+    service = Service(chromedriver) if chromedriver and os.path.exists(chromedriver) else Service()
+    return webdriver.Chrome(service=service, options=options)
+
+
+def wait_until_rendered(browser, timeout):
+    """Poll RENDERED_JS; returns False if the page never settled within `timeout` seconds."""
+    from selenium.common.exceptions import TimeoutException
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    try:
+        WebDriverWait(browser, timeout, poll_frequency=0.1).until(lambda b: b.execute_script(RENDERED_JS))
+        return True
+    except TimeoutException:
+        return False
+
+
+def html_to_png(browser, fn, timeout=30):
+    """Load docs/<map>.html and save the screenshot next to it as .png."""
+    tmpurl='file://{path}'.format(path=os.path.abspath(fn))
+    fn_png = fn.replace('.html','.png')
+    browser.get(tmpurl)
+    if not wait_until_rendered(browser, timeout):
+        print(f"{fn} still rendering after {timeout}s, screenshotting anyway", file=sys.stderr)
+    browser.save_screenshot(fn_png)
+    return fn_png
+
+
+class BrowserPool:
+    """Up to `size` headless Chrome sessions, started on first use and kept until close()."""
+
+    def __init__(self, size=3, chromedriver=CHROMEDRIVER, timeout=30):
+        self.size = size
+        self.chromedriver = chromedriver
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        self._browsers = []
+        self._lock = threading.Lock()
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            start = len(self._browsers) < self.size
+            if start:
+                self._browsers.append(None)  # reserve the slot while chrome starts
+        if not start:
+            return self._idle.get()
+        try:
+            browser = start_browser(self.chromedriver)
+        except Exception:
+            with self._lock:
+                self._browsers.remove(None)
+            raise
+        with self._lock:
+            self._browsers[self._browsers.index(None)] = browser
+        return browser
+
+    def warm(self):
+        """Start all the sessions now, in parallel, instead of on first use."""
+        with concurrent.futures.ThreadPoolExecutor(self.size) as pool:
+            browsers = list(pool.map(lambda _: self._checkout(), range(self.size)))
+        for browser in browsers:
+            self._idle.put(browser)
+        return self
+
+    @contextlib.contextmanager
+    def browser(self):
+        """Check out a session, e.g. for bokeh.io.export_png(..., webdriver=browser)."""
+        browser = self._checkout()
+        try:
+            yield browser
+        finally:
+            self._idle.put(browser)
+
+    def screenshot(self, fn):
+        with self.browser() as browser:
+            return html_to_png(browser, fn, self.timeout)
+
+    def screenshot_all(self, files):
+        with concurrent.futures.ThreadPoolExecutor(self.size) as pool:
+            return list(pool.map(self.screenshot, files))
+
+    def close(self):
+        with self._lock:
+            browsers, self._browsers = [b for b in self._browsers if b is not None], []
+        for browser in browsers:
+            browser.quit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def screenshot_maps(files=None, pool=None):
+    """Screenshot docs/*map*.html (or `files`), in parallel on `pool` or a pool of our own."""
+    if files is None:
+        files = glob.glob(os.path.join(DOCS, '*map*.html'))
+    if pool is not None:
+        return pool.screenshot_all(files)
+    with BrowserPool() as pool:
+        return pool.screenshot_all(files)
@@ -0,0 +1,150 @@
+"""As-of snapshots of the case feeds: each report date's rows, kept by date.
+
+A Store keeps what a feed published for each report date, one row per key
+(FIPS or state) with the feed's columns and that day's CaseWindows sums, as
+one Parquet file per date under SNAPSHOTS/<name>/.  Beside them index.json
+holds the row count of every date, the first and last date each key was
+reported, which dates are complete (every key the feed still reports
+reported: see RECENT) and, for every calendar day from the first snapshot
+on, the latest complete date on or before it.  So "the latest
+complete date" and "the metrics as of day D" are a dictionary or list lookup
+plus one small file read, rather than a parse of the whole history:
+
+    store = snapshots.Store('vdh')
+    store.update(df, cw)                # writes the dates not stored yet
+    day = store.latest()                # latest complete report date
+    counties.snapshot_metrics(store.read(store.as_of('01/15/2022')), pop)
+
+A date is rewritten by update() when the feed has more rows for it than the
+store, so a partial day published late is filled in on the next run (for VDH,
+load_cases() re-reads the cache's last day for this).
+"""
+import os, json
+
+import numpy as np
+import pandas as pd
+
+from . import DOWNLOADS, windows
+
+SNAPSHOTS = os.path.join(DOWNLOADS, 'snapshots')
+INDEX = 'index.json'
+DATE = '%Y-%m-%d'  # of the file names and index keys
+RECENT = 7  # days after its last report a key is still expected; after that the feed has dropped it
+
+
+class Store:
+    def __init__(self, name, key='FIPS', root=SNAPSHOTS):
+        self.name = name
+        self.key = key
+        self.dir = os.path.join(root, name)
+        self.index = self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.dir, INDEX)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'key': self.key, 'rows': {}, 'keys': {}, 'complete': {}, 'first': None, 'as_of': []}
+
+    def _write_index(self):
+        path = os.path.join(self.dir, INDEX)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.index, f)
+        os.replace(path + '.tmp', path)
+
+    def path(self, day):
+        return os.path.join(self.dir, _day(day).strftime(DATE) + '.parquet')
+
+    def update(self, df, cw, rebuild=False):
+        """Store the dates of long frame `df` (with its `cw` CaseWindows sums) that are new or grew; returns them."""
+        import pyarrow as pa, pyarrow.parquet as pq
+
+        os.makedirs(self.dir, exist_ok=True)
+        rows = self.index['rows']
+        counts = df['date'].value_counts()
+        new = sorted(day for day, n in counts.items()
+                     if rebuild or rows.get(day.strftime(DATE), -1) < n or not os.path.exists(self.path(day)))
+        if new:
+            # one merge and one Arrow conversion for every new date, then a slice of it per file
+            sums = cw.during(new)[[self.key, 'date'] + [windows.sum_column(n) for n in cw.spans]]
+            part = pd.merge(df[df['date'].isin(new)], sums, on=[self.key, 'date'], how='left')
+            table = pa.Table.from_pandas(part, preserve_index=False)
+            for day, pos in part.groupby('date').indices.items():
+                tmp = self.path(day) + '.tmp'
+                pq.write_table(table.take(pos), tmp)
+                os.replace(tmp, self.path(day))
+                rows[day.strftime(DATE)] = len(pos)
+        spans = df.groupby(self.key, observed=True)['date'].agg(['min', 'max'])
+        self.index['keys'] = {str(key): [first.strftime(DATE), last.strftime(DATE)]
+                              for key, first, last in zip(spans.index, spans['min'], spans['max'])}
+        self._reindex()
+        self._write_index()
+        return new
+
+    def expected(self):
+        """{date: how many keys should be in it}: those reported on or before it and
+        within RECENT days before it or on any later date."""
+        rows, keys = self.index['rows'], self.index.get('keys')
+        if not keys:  # an index from before the key spans were kept
+            return dict.fromkeys(rows, max(rows.values()))
+        start = np.datetime64(min(rows), 'D')
+        n = (np.datetime64(max(rows), 'D') - start).astype(int) + 1
+        spans = np.array(list(keys.values()), dtype='datetime64[D]') - start
+        first, last = spans[:, 0].astype(int), spans[:, 1].astype(int) + RECENT
+        counts = np.zeros(n + 1, dtype=int)
+        np.add.at(counts, np.clip(first, 0, n), 1)
+        np.add.at(counts, np.clip(last + 1, 0, n), -1)
+        counts = counts.cumsum()
+        return {day: int(counts[(np.datetime64(day, 'D') - start).astype(int)]) for day in rows}
+
+    def _reindex(self):
+        """Work out the complete dates and the dense as-of list from the row counts and key spans."""
+        rows = self.index['rows']
+        if not rows:
+            return
+        expected = self.expected()
+        self.index['complete'] = {day: n >= expected[day] for day, n in rows.items()}
+        first = min(rows)
+        days = pd.date_range(first, max(rows), freq='D').strftime(DATE)
+        latest, as_of = None, []
+        for day in days:
+            if self.index['complete'].get(day):
+                latest = day
+            as_of.append(latest)
+        self.index['first'], self.index['as_of'] = first, as_of
+
+    def dates(self):
+        """Every stored report date, oldest first."""
+        return sorted(pd.Timestamp(day) for day in self.index['rows'])
+
+    def has(self, day):
+        return _day(day).strftime(DATE) in self.index['rows']
+
+    def latest(self, complete=True):
+        """The latest (complete) report date, None for an empty store."""
+        if not complete:
+            return pd.Timestamp(max(self.index['rows'])) if self.index['rows'] else None
+        as_of = self.index['as_of']
+        return pd.Timestamp(as_of[-1]) if as_of and as_of[-1] else None
+
+    def as_of(self, day):
+        """The latest complete report date on or before `day`, None if there is none."""
+        as_of, first = self.index['as_of'], self.index['first']
+        if not first:
+            return None
+        i = (_day(day) - pd.Timestamp(first)).days
+        if i < 0:
+            return None
+        day = as_of[min(i, len(as_of) - 1)]
+        return pd.Timestamp(day) if day else None
+
+    def read(self, day):
+        """The rows stored for report date `day`; KeyError if there are none."""
+        if not self.has(day):
+            raise KeyError(f"no {self.name} snapshot for {_day(day):{DATE}}")
+        return pd.read_parquet(self.path(day))
+
+
+def _day(day):
+    """A Timestamp of `day`: a Timestamp, datetime or string (MM/DD/YYYY, YYYYMMDD or YYYY-MM-DD)."""
+    return pd.Timestamp(day).normalize()
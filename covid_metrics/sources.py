@@ -0,0 +1,100 @@
+"""County case feeds behind one interface.
+
+Everything past loading (CaseWindows, the CDC schemes, the county maps) only
+needs a long frame with one row per county and report date:
+
+    FIPS         int32 county FIPS
+    date         datetime64 report date
+    Locality     county name
+    Total Cases  cumulative cases
+
+A CountySource says where a feed comes from and how to read it into that
+frame; anything else the feed carries (VDH's health districts) can ride along.
+SOURCES holds the feeds there is an adapter for, and each keeps what it
+published for every report date in its snapshots.Store.
+"""
+import os
+
+import pandas as pd
+
+from . import DOWNLOADS, fetch, snapshots, vdh, windows
+
+
+class CountySource:
+    name = None
+    state = None  # 2 digit state FIPS the feed covers, None for the whole country
+
+    def download(self):
+        """Fetch the feed if it changed; True if it did."""
+        raise NotImplementedError
+
+    def load(self):
+        """The feed as the long frame above."""
+        raise NotImplementedError
+
+    def windows(self, df):
+        return windows.CaseWindows.from_frame(df, key='FIPS')
+
+    def snapshots(self):
+        """The feed's snapshots.Store of each report date."""
+        return snapshots.Store(self.name, key='FIPS')
+
+    def default_day(self, df):
+        """The report date (MM/DD/YYYY) to map by default: the latest every county reported,
+        per the snapshots once they are updated, else the latest in `df`."""
+        day = self.snapshots().latest() or df['date'].max()
+        return day.strftime(vdh.DATE_FORMAT)
+
+
+class VDH(CountySource):
+    """Virginia's localities, from the VDH public use dataset (see vdh)."""
+    name = 'vdh'
+    state = '51'
+
+    def download(self):
+        return vdh.download()
+
+    def load(self):
+        return vdh.load_cases()
+
+
+class NYTCounties(CountySource):
+    """Every US county from https://github.com/nytimes/covid-19-data (us-counties.csv).
+
+    The ~3 million row CSV is parsed once into a Parquet copy beside it, which
+    is all that's read until a newer CSV is fetched.  Rows without a FIPS (New
+    York City as a whole, 'Unknown' counties) are dropped.
+    """
+    name = 'nyt'
+    URL = 'https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-counties.csv'
+    CSV = os.path.join(DOWNLOADS, 'us-counties.csv')
+    DTYPES = {'date': 'category', 'county': 'category', 'state': 'category', 'fips': 'float64', 'cases': 'float64'}
+
+    def __init__(self, csv_name=CSV):
+        self.csv_name = csv_name
+
+    def download(self):
+        return fetch.fetch(self.URL, self.csv_name, max_age=86400/2)
+
+    def parse(self):
+        df = pd.read_csv(self.csv_name, usecols=list(self.DTYPES), dtype=self.DTYPES)
+        df = df[df['fips'].notna() & df['cases'].notna()]
+        return pd.DataFrame({
+            'FIPS': df['fips'].to_numpy(dtype='int32'),
+            'date': vdh.parse_dates(df['date'], format='%Y-%m-%d').to_numpy(),
+            'Locality': pd.Categorical(df['county'].astype(str) + ', ' + df['state'].astype(str)),
+            'Total Cases': df['cases'].to_numpy(dtype='int32'),
+        })
+
+    def load(self, rebuild=False):
+        cache = os.path.splitext(self.csv_name)[0] + '.parquet'
+        if not rebuild and os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(self.csv_name):
+            return pd.read_parquet(cache)
+        df = self.parse()
+        tmp = cache + '.tmp'
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, cache)
+        return df
+
+
+SOURCES = {source.name: source for source in [VDH(), NYTCounties()]}
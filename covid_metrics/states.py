@@ -0,0 +1,194 @@
+"""US states colored per the CDC foreign travel advisory thresholds.
+
+The library side of CovidStates.ipynb: CDC state PCR testing histories
+(https://beta.healthdata.gov/dataset/COVID-19-Diagnostic-Laboratory-Testing-PCR-Testing/j8mb-icvb),
+census state populations and the folium us-states.json outlines.  The
+mapping libraries are imported only by the functions that draw.
+"""
+import os, datetime
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from . import DOWNLOADS, DOCS, colormaps, fetch, geometry, population, schemes, snapshots, vdh, windows
+
+# Downloaded state data from https://github.com/python-visualization/folium/blob/master/examples/data/us-states.json
+STATE_JSON = os.path.join(DOWNLOADS, 'us-states.json')
+STATE_JSON_URL = 'https://raw.githubusercontent.com/python-visualization/folium/master/examples/data/us-states.json'
+
+# downloaded population data from Census https://www2.census.gov/programs-surveys/popest/datasets/2010-2019/state/detail/
+CENSUS_POP_STATE_FILE = population.STATE_FILE
+
+# 4 day lag seems to work
+CDC_URL = 'https://beta.healthdata.gov/api/views/j8mb-icvb/rows.csv?accessType=DOWNLOAD&api_foundry=true'
+CDC_FILE = os.path.join(DOWNLOADS, 'j8mb-icvb.csv')
+
+# the columns of CDC_FILE kept, read with these types; a state's total runs to 10^8
+CDC_DTYPES = {
+    'state': 'category',
+    'overall_outcome': 'category',
+    'date': 'category',
+    'new_results_reported': 'float64',
+    'total_results_reported': 'float64',
+}
+CDC_CHUNK = 1 << 16  # rows parsed at a time
+
+GEOJSON_FILE = 'USCovidStates.geojson'
+MAP_FILE = 'us_covid_states_map.html'
+DETAIL = 'low'  # geometry.DETAIL level of GEOJSON_FILE, plenty for the whole country at zoom 4
+
+STYLE = {'fillOpacity': 0.5, 'weight': 0}
+HIGHLIGHT = {'weight': 2, 'color':'black', 'fillOpacity': 0.4,}
+FILL = 'per100k_28daysum_fill'  # colorscale() of per100k_28daysum
+
+TOOLTIP_FIELDS = ['name',"date",'per100k_28daysum','per100k_7daysum',"POPESTIMATE2019",'foreign','school']
+TOOLTIP_ALIASES = ['State','Date','Cases/28d/100kpop','Cases/7d/100kpop','2019 Population','CDC Foreign Travel Rec.','CDC Community']
+
+TITLE_HTML = '''
+             <h3 align="center" style="font-size:16px"><b>{}</b></h3>
+             <h4 align="center" style="font-size:12px"><b>{}</b></h4>
+
+             <a href="https://github.com/drf5n/YCSD_covid_metrics">(source code)</a>
+             '''
+
+
+def snapshots_store():
+    """The CDC feed's snapshots.Store of each date, by state."""
+    return snapshots.Store('cdc', key='state')
+
+
+def default_day(store=None):
+    """The latest date every state is in, per the CDC snapshots.Store (as YYYYMMDD).
+
+    With no snapshots yet: the CDC feed lags, so the day from 5 days ago.
+    """
+    latest = (store or snapshots_store()).latest()
+    if latest is None:
+        latest = datetime.datetime.now()-datetime.timedelta(days = 5)
+    return latest.strftime("%Y%m%d")
+
+
+def load_geometry(path=STATE_JSON):
+    import geopandas
+
+    fetch.fetch(STATE_JSON_URL, path, max_age=None)
+    return geopandas.read_file(path)
+
+
+def load_population(index=None):
+    """Census state populations with their 2-letter `state_abbr`, from population.load()."""
+    index = population.load() if index is None else index
+    rows = population.states(index)
+    rows = rows[(rows.index > 0) & rows['census'].notna()]  # not the US total
+    return pd.DataFrame({'STATE': rows.index // 1000, 'NAME': rows['name'].to_numpy(),
+                         'POPESTIMATE2019': rows['census'].to_numpy(dtype=int), 'state_abbr': rows['state'].astype(str).to_numpy()})
+
+
+def download(path=CDC_FILE, max_age=86400/2):
+    """Fetch the CDC testing CSV if it changed, checking at most every `max_age` seconds."""
+    return fetch.fetch(CDC_URL, path, max_age=max_age)
+
+
+def load_cases(path=CDC_FILE, outcome='Positive', chunksize=CDC_CHUNK):
+    """Test result histories per state for one `outcome`, sorted by state and date.
+
+    The CSV is read `chunksize` rows at a time, keeping only CDC_DTYPES
+    columns and the `outcome` rows of each chunk, so the memory needed is
+    about one chunk plus the (state x date) result rather than the whole file.
+    """
+    parts = []
+    for chunk in pd.read_csv(path, usecols=list(CDC_DTYPES), dtype=CDC_DTYPES, chunksize=chunksize):
+        chunk = chunk[chunk['overall_outcome'] == outcome]
+        parts.append(chunk.drop(columns='overall_outcome'))
+    # each chunk has its own categories; union them rather than fall back to strings
+    covids = pd.DataFrame({
+        'state': union_categoricals([p['state'] for p in parts]),
+        'date': vdh.parse_dates(union_categoricals([p['date'] for p in parts]), format=None),
+    })
+    for column in ['new_results_reported', 'total_results_reported']:
+        covids[column] = np.concatenate([p[column].to_numpy() for p in parts])
+    return covids.sort_values(by=['state', 'date'], ignore_index=True)
+
+
+def state_windows(df):
+    return windows.CaseWindows.from_frame(df, key='state', value='total_results_reported')
+
+
+def state_metrics(df, cw, pop_augment, doi):
+    """One row per state on `doi` with per 100k window rates and CDC categories."""
+    dfy = df[df['date']==doi]
+    pop = pop_augment.set_index('state_abbr')['POPESTIMATE2019']
+    return _metrics(dfy, cw.on(doi, pop=pop), pop_augment)
+
+
+def snapshot_metrics(snapshot, pop_augment):
+    """state_metrics() of one day's rows from a snapshots.Store, no history needed."""
+    pop = pop_augment.set_index('state_abbr')['POPESTIMATE2019']
+    columns = ['state', 'date', 'new_results_reported', 'total_results_reported']
+    return _metrics(snapshot[columns], windows.snapshot_rates(snapshot, 'state', pop), pop_augment)
+
+
+def _metrics(dfy, rates, pop_augment):
+    dfy = pd.merge(dfy, rates, on=['state','date'], how='left')
+    dfya = dfy.set_index('state').join(pop_augment.set_index('state_abbr'),lsuffix='lj').reset_index()
+
+    dfya['foreign'] = schemes.SCHEMES['foreign'].label(dfya['per100k_28daysum'])
+    dfya['school'] = schemes.SCHEMES['k12'].label(dfya['per100k_7daysum'])
+    return dfya
+
+
+def join_geometry(state, dfya, path=GEOJSON_FILE, detail=DETAIL, topo=False):
+    """State outlines joined with the metrics.
+
+    Also written to `path` for the map, with just the tooltip columns and
+    fill colours, and the outlines simplified to `detail` (as TopoJSON with `topo`).
+    """
+    gjson = state.set_index('id').join(dfya[['state','date','new_results_reported','POPESTIMATE2019','per100k_1daysum','per100k_7daysum', 'per100k_28daysum','foreign','school']].set_index('state'))
+    if path:
+        fills = gjson[TOOLTIP_FIELDS + [gjson.geometry.name]].assign(**{FILL: colormaps.hex_colors(colorscale(), gjson['per100k_28daysum'])})
+        with open(path, 'w') as f:
+            f.write(geometry.encode(fills, detail, topo))
+    return gjson
+
+
+def colorscale():
+    import branca # for a colorscale
+
+    # branca color names are defined in https://raw.githubusercontent.com/python-visualization/branca/master/branca/_cnames.json
+    # Foreign 50,100,500
+    colorscale_28l = branca.colormap.StepColormap(
+        ['yellow','orange','darkorange','red','red','#440000'],
+        index=[0,50,100,500,510,3000], caption='New Cases/28days/100k',vmin=0, vmax=3000,
+    ).to_linear()
+    colorscale_28l.caption='New Cases/28days/100k (red > 500, Very High)'
+    return colorscale_28l
+
+
+def make_map(geojson, doi):
+    import folium
+
+    colorscale_28l = colorscale()
+
+    m = folium.Map(location=[37.9, -90], zoom_start=4)
+
+    loc = f"""{doi} US States COVID risk per CDC <a href="https://www.cdc.gov/coronavirus/2019-ncov/travelers/map-and-travel-notices.html">Foreign Travel</a>
+      and <a href="https://www.cdc.gov/coronavirus/2019-ncov/community/schools-childcare/k-12-guidance.html">School/Community</a> Risk Categories</a>"""
+    subt = """(Red is CDC Level 4: >500cases/28days/100k, Very High, Avoid all travel" and Black is 10x higher)"""
+
+    geometry.layer(
+        geojson, FILL, STYLE, HIGHLIGHT,
+        tooltip=folium.features.GeoJsonTooltip(fields=TOOLTIP_FIELDS, aliases=TOOLTIP_ALIASES),
+    ).add_to(m)
+    m.add_child(colorscale_28l)
+    m.get_root().html.add_child(folium.Element(TITLE_HTML.format(loc,subt)))
+    return m
+
+
+def save_map(doi, geojson=GEOJSON_FILE, docs=DOCS, split=True):
+    """docs/MAP_FILE over `geojson`; with `split` its outlines and table are geometry.publish()ed beside it."""
+    path = os.path.join(docs, MAP_FILE)
+    if split:
+        geojson = geometry.publish(geojson, docs, os.path.splitext(MAP_FILE)[0])
+    make_map(geojson, doi).save(path)
+    return path
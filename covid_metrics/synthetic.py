@@ -0,0 +1,131 @@
+"""Synthetic data in the shape of the real downloads, at any size.
+
+For benchmarks (see bench) and for trying the package without the real
+files: `vdh_cases` follows VA_vdh_casedata.csv, `cdc_states` the CDC
+j8mb-icvb state testing CSV, `county_geometry` the counties.geojson outlines
+and `county_population` what counties.load_population() returns.  Everything
+is seeded, so the same arguments give the same data.
+
+The outlines are a grid of cells over Virginia's bounding box whose edges
+are jagged but shared exactly between neighbours, so they behave like a real
+county coverage under geometry.simplify.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import vdh
+
+LOCALITIES = 133  # Virginia's counties and independent cities
+DAYS = 1000  # about the length of the VDH history
+START = '2020-03-17'
+STATES = 56  # states, DC and territories in the CDC data
+OUTCOMES = ['Inconclusive', 'Negative', 'Positive']
+
+BOUNDS = (-83.7, 36.5, -75.2, 39.5)  # lon/lat box the county grid covers
+EDGE_VERTICES = 32  # vertices along each side of a cell
+
+
+def fips_codes(localities=LOCALITIES):
+    """Distinct 5 digit FIPS, Virginia's (51xxx) first, further states as needed."""
+    i = np.arange(localities)
+    return ((51 + i // 999) * 1000 + i % 999 + 1).astype('int32')
+
+
+def vdh_cases(localities=LOCALITIES, days=DAYS, seed=0):
+    """A VDH public use dataset: cumulative Total Cases per locality and day, sorted by Report Date."""
+    rng = np.random.default_rng(seed)
+    fips = fips_codes(localities)
+    dates = pd.date_range(START, periods=days)
+    # localities differ in size and the daily counts wander around that
+    scale = rng.lognormal(3, 1, localities)
+    new = rng.poisson(scale[None, :] * rng.gamma(2, 0.5, (days, localities)))
+    total = np.cumsum(new, axis=0)
+    d, k = np.divmod(np.arange(days * localities), localities)
+    # strings as categoricals, or 100x the VA data is gigabytes of Python str
+    return pd.DataFrame({
+        'Report Date': pd.Categorical.from_codes(d, dates.strftime(vdh.DATE_FORMAT)),
+        'FIPS': fips[k],
+        'Locality': pd.Categorical.from_codes(k, [f'Locality {i}' for i in range(localities)]),
+        'VDH Health District': pd.Categorical.from_codes(k % 35, [f'District {i}' for i in range(35)]),
+        'Total Cases': total.ravel(),
+        'Hospitalizations': total.ravel() // 20,
+        'Deaths': total.ravel() // 100,
+    })
+
+
+def cdc_states(states=STATES, days=DAYS, seed=0):
+    """The CDC state PCR testing history: every state x outcome x day."""
+    rng = np.random.default_rng(seed)
+    abbr = np.array([f'S{i:02d}' for i in range(states)])
+    dates = pd.date_range(START, periods=days)
+    new = rng.poisson(2000, (states, len(OUTCOMES), days))
+    total = np.cumsum(new, axis=2)
+    s, o, d = np.unravel_index(np.arange(new.size), new.shape)
+    return pd.DataFrame({
+        'state': pd.Categorical.from_codes(s, abbr),
+        'state_name': pd.Categorical.from_codes(s, [f'State {i}' for i in range(states)]),
+        'state_fips': s + 1,
+        'fema_region': pd.Categorical.from_codes(s % 10, [f'Region {i + 1}' for i in range(10)]),
+        'overall_outcome': pd.Categorical.from_codes(o, OUTCOMES),
+        'date': pd.Categorical.from_codes(d, dates.strftime('%Y/%m/%d')),
+        'new_results_reported': new.ravel(),
+        'total_results_reported': total.ravel(),
+        'geocoded_state': '',
+    })
+
+
+def county_population(fips, seed=0):
+    """counties.load_population() for `fips`."""
+    rng = np.random.default_rng(seed)
+    fips = np.asarray(fips, dtype=int)
+    coest = pd.DataFrame({'FIPS': fips, 'STNAME': 'Virginia', 'CTYNAME': [f'County {f}' for f in fips],
+                          'POPESTIMATE2019': rng.integers(2000, 1000000, len(fips))})
+    coest['FIPSstr'] = coest['FIPS'].astype(str).str.zfill(5)
+    return coest
+
+
+def county_geometry(fips, seed=0, edge_vertices=EDGE_VERTICES):
+    """GeoDataFrame of one jagged grid cell per FIPS, with counties.geojson's GEOID, NAME, STATEFP, COUNTYFP."""
+    import geopandas, shapely
+
+    rng = np.random.default_rng(seed)
+    fips = np.asarray(fips, dtype=int)
+    cols = int(np.ceil(np.sqrt(len(fips) * 2)))  # the box is about twice as wide as tall
+    rows = int(np.ceil(len(fips) / cols))
+    k = edge_vertices
+    x0, y0, x1, y1 = BOUNDS
+    # one lattice of vertices for the whole grid, jittered inside, so neighbours share their edges
+    xs = np.linspace(x0, x1, cols * k + 1)
+    ys = np.linspace(y0, y1, rows * k + 1)
+    gx, gy = np.meshgrid(xs, ys)
+    dx, dy = (x1 - x0) / (cols * k), (y1 - y0) / (rows * k)
+    gx[1:-1, 1:-1] += rng.uniform(-0.3, 0.3, (rows * k - 1, cols * k - 1)) * dx
+    gy[1:-1, 1:-1] += rng.uniform(-0.3, 0.3, (rows * k - 1, cols * k - 1)) * dy
+
+    # boundary walk of a cell's k x k block of lattice points, counter clockwise
+    side = np.arange(k)
+    walk_r = np.concatenate([np.zeros(k), side, np.full(k, k), k - side, [0]]).astype(int)
+    walk_c = np.concatenate([side, np.full(k, k), k - side, np.zeros(k), [0]]).astype(int)
+    polygons = []
+    for i in range(len(fips)):
+        r, c = divmod(i, cols)
+        rr, cc = r * k + walk_r, c * k + walk_c
+        polygons.append(shapely.Polygon(np.column_stack([gx[rr, cc], gy[rr, cc]])))
+
+    geoid = pd.Series(fips).astype(str).str.zfill(5)
+    return geopandas.GeoDataFrame({
+        'GEOID': geoid, 'NAME': [f'County {f}' for f in fips],
+        'STATEFP': geoid.str[:2], 'COUNTYFP': geoid.str[2:],
+    }, geometry=polygons, crs='EPSG:4326')
+
+
+def write_dataset(dirname, localities=LOCALITIES, days=DAYS, seed=0):
+    """Write VA_vdh_casedata.csv, j8mb-icvb.csv and counties.geojson into `dirname`; returns their paths."""
+    os.makedirs(dirname, exist_ok=True)
+    paths = {name: os.path.join(dirname, name) for name in ['VA_vdh_casedata.csv', 'j8mb-icvb.csv', 'counties.geojson']}
+    vdh_cases(localities, days, seed).to_csv(paths['VA_vdh_casedata.csv'], index=False)
+    cdc_states(days=days, seed=seed).to_csv(paths['j8mb-icvb.csv'], index=False)
+    county_geometry(fips_codes(localities), seed).to_file(paths['counties.geojson'], driver='GeoJSON')
+    return paths
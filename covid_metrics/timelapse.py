@@ -0,0 +1,165 @@
+"""County map with a date slider over the whole VDH history.
+
+The page holds the county outlines once, as one GeoJSON layer whose features
+only carry their name and a row number.  Every day's values live beside it as
+base64 packed typed arrays, row major by county: the 7 and 28 day rates as
+Uint16 (whole cases per 100k, 65535 for none) and the school and foreign travel
+levels as Int8 codes into schemes.SCHEMES labels.  Moving the slider
+restyles the layer from those arrays, with the colour looked up in a palette
+holding the daily map's branca colour for each whole rate from vmin to vmax.
+"""
+import os, base64
+
+import numpy as np
+import pandas as pd
+
+from . import DOCS, colormaps, counties, geometry, schemes
+
+MAP_FILE = 'va_counties_timelapse.html'
+MAP = 'va_counties_map'  # the counties.MAPS entry whose metric, colours and title are animated
+DETAIL = 'medium'
+
+NONE = 65535
+
+TEMPLATE = """
+{% macro script(this, kwargs) %}
+(function() {
+    const map = {{ this._parent.get_name() }};
+    const layer = {{ this.layer.get_name() }};
+    const data = {{ this.data|tojson }};
+    function decode(b64, Type) {
+        const s = atob(b64), bytes = new Uint8Array(s.length);
+        for (let i = 0; i < s.length; i++) bytes[i] = s.charCodeAt(i);
+        return new Type(bytes.buffer);
+    }
+    const rate7 = decode(data.rate7, Uint16Array), rate28 = decode(data.rate28, Uint16Array);
+    const school = decode(data.school, Int8Array), foreign = decode(data.foreign, Int8Array);
+    const days = data.days, start = Date.parse(data.start);
+    let day = days - 1, timer = null;
+
+    const dateStr = (d) => new Date(start + d * 86400000).toISOString().slice(0, 10);
+    const value = (v) => v === {{ this.none }} ? 'n/a' : v;
+    function color(v) {
+        if (v === {{ this.none }}) return data.missing;
+        return data.palette[Math.max(0, Math.min(data.palette.length - 1, v - data.vmin))];
+    }
+    function draw() {
+        layer.setStyle((f) => Object.assign({}, data.style, {fillColor: color(rate7[f.properties.row * days + day])}));
+        slider.value = day;
+        label.textContent = dateStr(day);
+    }
+    layer.eachLayer((l) => l.bindTooltip(() => {
+        const i = l.feature.properties.row * days + day;
+        return `<b>${l.feature.properties.Locality}</b> ${dateStr(day)}<br>`
+            + `Cases/7d/100kpop: ${value(rate7[i])}<br>Community Risk: ${data.school_labels[school[i]] || ''}<br>`
+            + `Cases/28d/100kpop: ${value(rate28[i])}<br>CDC on Travel: ${data.foreign_labels[foreign[i]] || ''}`;
+    }, {sticky: true}));
+    layer.eachLayer((l) => l.on({
+        mouseover: (e) => e.target.setStyle(data.highlight),
+        mouseout: (e) => draw(),
+    }));
+
+    const control = L.control({position: 'bottomleft'});
+    let slider, label;
+    control.onAdd = function() {
+        const div = L.DomUtil.create('div', 'leaflet-bar');
+        div.style.background = 'white';
+        div.style.padding = '4px 8px';
+        const play = L.DomUtil.create('button', '', div);
+        play.textContent = '▶';
+        slider = L.DomUtil.create('input', '', div);
+        Object.assign(slider, {type: 'range', min: 0, max: days - 1, value: day});
+        slider.style.width = '300px';
+        label = L.DomUtil.create('span', '', div);
+        slider.oninput = () => { day = +slider.value; draw(); };
+        play.onclick = () => {
+            if (timer) { clearInterval(timer); timer = null; play.textContent = '▶'; return; }
+            if (day === days - 1) day = 0;
+            play.textContent = '❚❚';
+            timer = setInterval(() => { if (day >= days - 1) { play.onclick(); return; } day++; draw(); }, 60);
+        };
+        L.DomEvent.disableClickPropagation(div);
+        return div;
+    };
+    control.addTo(map);
+    draw();
+})();
+{% endmacro %}
+"""
+
+
+def pack(values, dtype):
+    """`values` as little endian `dtype` bytes, base64 encoded for the page."""
+    return base64.b64encode(np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder('<')).tobytes()).decode()
+
+
+def _rates(rates):
+    return np.where(np.isnan(rates), NONE, np.clip(np.round(rates), 0, NONE - 1))
+
+
+def history(cw, pop, geoids):
+    """The per day arrays of the page for the counties `geoids`, in that order.
+
+    `cw` is a FIPS keyed `windows.CaseWindows`, `pop` the population by FIPS.
+    """
+    rows = cw.keys.get_indexer(np.asarray(geoids, dtype=int))
+    rates = cw.per100k(pop)
+    levels = schemes.Levels(cw, pop, names=('school', 'foreign'))
+
+    def take(a):
+        # counties without VDH data get an all missing row
+        out = np.full((len(rows), a.shape[-1]), np.nan if a.dtype.kind == 'f' else -1, dtype=a.dtype)
+        out[rows >= 0] = a[rows[rows >= 0]]
+        return out
+
+    return {
+        'start': cw.dates[0].strftime('%Y-%m-%d'),
+        'days': len(cw.dates),
+        'rate7': pack(_rates(take(rates[:, cw.spans.index(7), :])), 'u2'),
+        'rate28': pack(_rates(take(rates[:, cw.spans.index(28), :])), 'u2'),
+        'school': pack(take(levels.codes['school']), 'i1'),
+        'foreign': pack(take(levels.codes['foreign']), 'i1'),
+        'school_labels': schemes.SCHEMES['school'].labels,
+        'foreign_labels': schemes.SCHEMES['foreign'].labels,
+    }
+
+
+def make_map(shapes, data, name=MAP):
+    """folium map of `shapes` (GEOID indexed county outlines) animated over `data` from history()."""
+    import folium
+    from branca.element import MacroElement
+    from jinja2 import Template
+
+    class Slider(MacroElement):
+        _template = Template(TEMPLATE)
+
+        def __init__(self, layer, data):
+            super().__init__()
+            self._name = 'Slider'
+            self.layer, self.data, self.none = layer, data, NONE
+
+    spec = counties.MAPS[name]
+    colorscale = counties.colorscales()[spec['span']]
+    data = dict(data, style=counties.STYLE, highlight=counties.HIGHLIGHT, missing=colormaps.MISSING, vmin=colorscale.vmin,
+                palette=colormaps.hex_colors(colorscale, np.arange(colorscale.vmin, colorscale.vmax + 1)).tolist())
+
+    m = folium.Map(location=[37.9, -77.9], zoom_start=7)
+    layer = folium.GeoJson(geometry.encode(shapes[['Locality', 'row', shapes.geometry.name]], DETAIL), name='geojson')
+    layer.add_to(m)
+    Slider(layer, data).add_to(m)
+    m.add_child(colorscale)
+    m.get_root().html.add_child(folium.Element(counties.TITLE_HTML.format(spec['title'], spec['subtitle'])))
+    return m
+
+
+def save_map(df, cw, coestva, shapes, docs=DOCS):
+    """docs/MAP_FILE over all of `cw`, for the county outlines `shapes` from counties.load_geometry()."""
+    shapes = shapes.copy()
+    names = df.drop_duplicates('FIPS', keep='last').set_index('FIPS')['Locality'].astype(str)
+    names = names.reindex(shapes.index.astype(int)).to_numpy()
+    shapes['Locality'] = np.where(pd.isna(names), shapes['NAME'], names)
+    shapes['row'] = np.arange(len(shapes))
+    data = history(cw, coestva.set_index('FIPS')['POPESTIMATE2019'], shapes.index)
+    path = os.path.join(docs, MAP_FILE)
+    make_map(shapes, data).save(path)
+    return path
@@ -0,0 +1,129 @@
+"""VDH COVID-19 case data with a local Parquet history cache.
+
+VDH publishes the whole case history as one ever-growing CSV at
+https://data.virginia.gov/Government/VDH-COVID-19-PublicUseDataset-Cases/bre9-aqqr
+sorted by Report Date.  Instead of re-parsing all of it every run we keep a
+typed Parquet copy of the history next to the CSV and, when a new CSV shows up,
+only parse the rows at its tail from the cache's last Report Date on (that day
+is read again, in case VDH had only published part of it).
+"""
+import os, io, csv, datetime
+
+import pandas as pd
+
+from . import fetch
+
+URL = 'https://data.virginia.gov/api/views/bre9-aqqr/rows.csv?accessType=DOWNLOAD'
+CSV_NAME = "VA_vdh_casedata.csv"
+DATE_FORMAT = "%m/%d/%Y"
+
+# the columns the metrics use, read with these types; the rest of the CSV
+# (Hospitalizations, Deaths) is never parsed
+DTYPES = {
+    'Report Date': 'category',
+    'FIPS': 'int32',
+    'Locality': 'category',
+    'VDH Health District': 'category',
+    'Total Cases': 'int32',
+}
+
+TAIL_BLOCK = 1 << 16  # first guess at how many bytes hold the new days
+
+
+def download(csv_name=CSV_NAME, max_age=86400/2):
+    """Fetch the VDH CSV if it changed, checking at most every `max_age` seconds; True if it did.
+
+    An unchanged CSV costs a 304 and keeps its mtime, so load_cases() doesn't look at it.
+    """
+    return fetch.fetch(URL, csv_name, max_age=max_age)
+
+
+def cache_path(csv_name=CSV_NAME):
+    return os.path.splitext(csv_name)[0] + '.parquet'
+
+
+def read_csv(source, **kwargs):
+    """The DTYPES columns of a VDH CSV (path or file object), typed as they are parsed."""
+    return pd.read_csv(source, usecols=list(DTYPES), dtype=DTYPES, **kwargs)
+
+
+def parse_dates(report_dates, format=DATE_FORMAT):
+    """datetime64 of MM/DD/YYYY (or `format`) strings, each distinct string parsed once."""
+    dates = pd.Categorical(report_dates)
+    return pd.Series(pd.to_datetime(dates.categories, format=format)[dates.codes].to_numpy(),
+                     index=getattr(report_dates, 'index', None))
+
+
+def _typed(df):
+    for col, dtype in DTYPES.items():
+        df[col] = df[col].astype(dtype)
+    df["date"] = parse_dates(df['Report Date'])
+    return df
+
+
+def _read_header(csv_name):
+    with open(csv_name, newline='') as f:
+        return next(csv.reader(f))
+
+
+def _read_tail(csv_name, after):
+    """Parse only the rows of `csv_name` with a Report Date of `after` or later.
+
+    Relies on the VDH file being sorted by Report Date: blocks are read from
+    the end of the file, growing until the first whole line in the block is
+    from before `after` (or the start of the file is reached).
+    """
+    after = pd.Timestamp(after).to_pydatetime()
+    dates = {}
+
+    def line_date(line):
+        key = line.split(b',', 1)[0].strip(b'"\r ')
+        if key not in dates:
+            dates[key] = datetime.datetime.strptime(key.decode(), DATE_FORMAT)
+        return dates[key]
+
+    size = os.path.getsize(csv_name)
+    block = TAIL_BLOCK
+    with open(csv_name, 'rb') as f:
+        while True:
+            start = max(0, size - block)
+            f.seek(start)
+            # drop the header, or the partial line we seeked into
+            lines = [l for l in f.read().split(b'\n')[1:] if l.strip()]
+            if start == 0 or (lines and line_date(lines[0]) < after):
+                break
+            block *= 4
+
+    new = [l for l in lines if line_date(l) >= after]
+    if not new:
+        return None
+    return read_csv(io.BytesIO(b'\n'.join(new)), header=None, names=_read_header(csv_name))
+
+
+def load_cases(csv_name=CSV_NAME, rebuild=False):
+    """Return the VDH case history, updating the Parquet cache from `csv_name`.
+
+    With no cache (or `rebuild=True`) the whole CSV is parsed once.  After
+    that, a CSV newer than the cache only has the rows from the cache's last
+    Report Date on parsed, replacing that day (VDH may have published only part
+    of it) and appending the new ones; an unchanged CSV is not read at all.
+    """
+    cache = cache_path(csv_name)
+    df = None if rebuild or not os.path.exists(cache) else pd.read_parquet(cache)
+    if df is None or set(df.columns) != set(DTYPES) | {'date'}:
+        # no cache, or one from before the columns were pruned
+        df = _typed(read_csv(csv_name))
+    else:
+        if not os.path.exists(csv_name) or os.path.getmtime(csv_name) <= os.path.getmtime(cache):
+            return df
+        last = df['date'].max()
+        new = _read_tail(csv_name, last)
+        if new is None or len(new) == (df['date'] == last).sum():
+            os.utime(cache)  # nothing new, don't rescan this CSV next time
+            return df
+        df = _typed(pd.concat([df[df['date'] < last], new], ignore_index=True))
+
+    tmp = cache + '.tmp'
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, cache)
+    return df
@@ -0,0 +1,124 @@
+"""Rolling-window case counts for every locality and day at once.
+
+The cumulative `Total Cases` column is pivoted once into a dense
+(locality x calendar day) array.  Report dates missing from the feed are
+filled by carrying the last total forward, so an n-day window always spans n
+calendar days rather than n rows.  All window sums come out of one fancy-indexed
+subtraction, giving a (locality x span x day) array that the county maps and
+the locality time series just slice.
+"""
+import numpy as np
+import pandas as pd
+
+SPANS = (1, 7, 14, 28)
+
+
+def sum_column(n):
+    """Name of the n-day new case column, as used in the notebooks."""
+    return 'TC_diff' if n == 1 else f'TC_sum{n}'
+
+
+def rate_column(n):
+    return f'per100k_{n}daysum'
+
+
+class CaseWindows:
+    """n-day new case sums (and per 100k rates) for a locality x date pivot.
+
+    `totals` is the forward filled cumulative array, `observed` marks the
+    cells that were actually in the feed and `sums[k, s, d]` is the number of
+    new cases for key k in the `spans[s]` days ending on `dates[d]`.
+    """
+
+    def __init__(self, totals, keys, dates, observed=None, spans=SPANS, key='Locality'):
+        self.key = key
+        self.keys = pd.Index(keys)
+        self.dates = pd.DatetimeIndex(dates)
+        self.totals = np.asarray(totals, dtype=float)
+        self.observed = ~np.isnan(self.totals) if observed is None else np.asarray(observed)
+        self.spans = tuple(spans)
+        self.sums = self._window_sums(self.totals, self.spans)
+
+    @classmethod
+    def from_frame(cls, df, key='Locality', value='Total Cases', spans=SPANS):
+        """Pivot a long (key, date, value) frame such as `vdh.load_cases()`.
+
+        Same result as pivot_table(aggfunc='last') over every calendar day,
+        but scattered straight into the array: a national county feed is
+        millions of rows.
+        """
+        df = df[df[value].notna()]
+        codes, keys = pd.factorize(df[key], sort=True)
+        dates = pd.DatetimeIndex(df['date'])
+        start = dates.min()
+        days = pd.date_range(start, dates.max(), freq='D')
+        cells = codes * len(days) + (dates - start).days.to_numpy()
+        # the last row of each (key, day), as aggfunc='last'
+        last = len(cells) - 1 - np.unique(cells[::-1], return_index=True)[1]
+        wide = np.full((len(keys), len(days)), np.nan)
+        wide.flat[cells[last]] = df[value].to_numpy(dtype=float)[last]
+        observed = ~np.isnan(wide)
+        totals = pd.DataFrame(wide).ffill(axis=1).to_numpy()
+        return cls(totals, pd.Index(np.asarray(keys), name=key), days, observed=observed, spans=spans, key=key)
+
+    @staticmethod
+    def _window_sums(totals, spans):
+        # prev[k, s, d] = totals[k, d - spans[s]], NaN before the start
+        back = np.arange(totals.shape[1])[None, :] - np.asarray(spans)[:, None]
+        prev = totals[:, np.maximum(back, 0)]
+        prev[:, back < 0] = np.nan
+        # like groupby().diff(n).fillna(0): no window before a locality's first n days
+        return np.nan_to_num(totals[:, None, :] - prev)
+
+    def span(self, n):
+        """The (key x day) array of n-day sums."""
+        return self.sums[:, self.spans.index(n), :]
+
+    def per100k(self, pop):
+        """(key x span x day) new cases per 100k for `pop`, a Series indexed by key or a number."""
+        return self.sums * 100000 / self._pop(pop, self.keys)[:, None, None]
+
+    def _pop(self, pop, keys):
+        if np.isscalar(pop):
+            return np.full(len(keys), float(pop))
+        return pd.Series(pop).reindex(keys).to_numpy(dtype=float)
+
+    def _frame(self, rows, cols, pop=None):
+        keys, dates = self.keys[rows], self.dates[cols]
+        k, d = np.nonzero(self.observed[rows][:, cols])
+        sums = self.sums[rows][:, :, cols][k, :, d]
+        out = pd.DataFrame({self.key: keys[k], 'date': dates[d]})
+        for i, n in enumerate(self.spans):
+            out[sum_column(n)] = sums[:, i]
+        if pop is not None:
+            rates = sums * 100000 / self._pop(pop, keys)[k, None]
+            for i, n in enumerate(self.spans):
+                out[rate_column(n)] = rates[:, i]
+        return out
+
+    def frame(self, pop=None):
+        """Long frame of every reported (key, date) with its window columns."""
+        return self._frame(slice(None), slice(None), pop)
+
+    def on(self, date, pop=None):
+        """Every key reported on `date`."""
+        return self._frame(slice(None), self.dates == pd.Timestamp(date), pop)
+
+    def during(self, dates, pop=None):
+        """Every key reported on any of `dates`."""
+        return self._frame(slice(None), self.dates.isin(pd.DatetimeIndex(dates)), pop)
+
+    def series(self, key, pop=None):
+        """The reported history of one key."""
+        return self._frame(self.keys == key, slice(None), pop)
+
+
+def snapshot_rates(rows, key, pop, spans=SPANS):
+    """What CaseWindows.on(day, pop) gives, from rows already carrying that day's sum columns
+    (a snapshots.Store day)."""
+    spans = [n for n in spans if sum_column(n) in rows]
+    out = rows[[key, 'date'] + [sum_column(n) for n in spans]].copy()
+    pop = pd.Series(pop).reindex(out[key]).to_numpy(dtype=float)
+    for n in spans:
+        out[rate_column(n)] = out[sum_column(n)] * 100000 / pop
+    return out
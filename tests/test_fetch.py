@@ -0,0 +1,101 @@
+"""fetch() against a local http.server standing in for the real sources."""
+import os, json, threading
+import http.server
+
+import pytest
+
+from covid_metrics import fetch
+
+BODY = bytes(range(256)) * 64  # 16 kB
+
+
+class Source(http.server.BaseHTTPRequestHandler):
+    """Serves `body` with an ETag, honouring If-None-Match and Range + If-Range.
+
+    With `cut` set, the next response stops after that many bytes of the body.
+    """
+    body, etag, cut = BODY, '"v1"', None
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        if self.headers.get('Range') and self.headers.get('If-Range') == self.etag:
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+        body = self.body[start:]
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header('Content-Range', f'bytes {start}-{len(self.body) - 1}/{len(self.body)}')
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        cut, type(self).cut = type(self).cut, None
+        self.wfile.write(body[:cut])
+        if cut is not None:
+            self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def source():
+    handler = type('Handler', (Source,), {'requests': []})
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield handler, f'http://127.0.0.1:{server.server_address[1]}/data.csv'
+    server.shutdown()
+    server.server_close()
+
+
+def test_unchanged_source_is_a_304(source, tmp_path):
+    handler, url = source
+    path = str(tmp_path / 'data.csv')
+
+    assert fetch.fetch(url, path)
+    assert open(path, 'rb').read() == BODY
+    assert fetch.read_record(path)['etag'] == '"v1"'
+
+    assert not fetch.fetch(url, path)
+    assert handler.requests[-1]['If-None-Match'] == '"v1"'
+    assert open(path, 'rb').read() == BODY
+
+
+def test_interrupted_transfer_is_kept_as_part_and_resumed(source, tmp_path):
+    handler, url = source
+    path = str(tmp_path / 'data.csv')
+    handler.cut = 5000
+
+    with pytest.raises(OSError, match='kept to resume'):
+        fetch.fetch(url, path)
+    # nothing at path until the whole body is in
+    assert not os.path.exists(path)
+    assert os.path.getsize(path + '.part') == 5000
+
+    assert fetch.fetch(url, path)
+    assert handler.requests[-1]['Range'] == 'bytes=5000-'
+    assert handler.requests[-1]['If-Range'] == '"v1"'
+    assert open(path, 'rb').read() == BODY
+    assert fetch.read_record(path)['resumed_from'] == 5000
+    assert not os.path.exists(path + '.part')
+    assert not os.path.exists(fetch.record_path(path + '.part'))
+
+
+def test_changed_source_is_fetched_whole(source, tmp_path):
+    handler, url = source
+    path = str(tmp_path / 'data.csv')
+    # a partial download of an older version
+    with open(path + '.part', 'wb') as f:
+        f.write(b'old' * 100)
+    with open(fetch.record_path(path + '.part'), 'w') as f:
+        json.dump({'url': url, 'etag': '"v0"'}, f)
+
+    assert fetch.fetch(url, path)
+    assert handler.requests[-1]['If-Range'] == '"v0"'
+    assert open(path, 'rb').read() == BODY
+    assert fetch.read_record(path)['resumed_from'] == 0
@@ -0,0 +1,37 @@
+"""Store.update() keeping the snapshots of a feed whose last day arrives in parts."""
+import pandas as pd
+
+from covid_metrics import snapshots, windows
+
+FIPS = [51001 + 2 * i for i in range(10)]
+
+
+def cases(days, last=len(FIPS)):
+    """A long frame of `days` report dates, the last one with only `last` of the localities."""
+    frames = []
+    for day in range(days):
+        fips = FIPS[:last] if day == days - 1 else FIPS
+        frames.append(pd.DataFrame({'date': pd.Timestamp('2021-03-01') + pd.Timedelta(days=day),
+                                    'FIPS': fips, 'Total Cases': [day * 10 + i for i in range(len(fips))]}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def update(store, df):
+    return store.update(df, windows.CaseWindows.from_frame(df, key='FIPS', value='Total Cases'))
+
+
+def test_partial_day_is_completed_by_update(tmp_path):
+    store = snapshots.Store('vdh', root=str(tmp_path))
+    update(store, cases(3, last=4))
+    # the partial day is stored but not complete, so the latest falls back a day
+    assert store.latest(complete=False) == pd.Timestamp('2021-03-03')
+    assert store.latest() == pd.Timestamp('2021-03-02')
+    assert len(store.read('2021-03-03')) == 4
+
+    # the rest of the day published later; only that day is rewritten
+    assert update(store, cases(3)) == [pd.Timestamp('2021-03-03')]
+    assert store.latest() == pd.Timestamp('2021-03-03')
+    assert sorted(store.read('2021-03-03')['FIPS']) == FIPS
+
+    # and reopening the store reads the same from its index
+    assert snapshots.Store('vdh', root=str(tmp_path)).as_of('2021-03-05') == pd.Timestamp('2021-03-03')
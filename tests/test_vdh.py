@@ -0,0 +1,53 @@
+"""load_cases() keeping its Parquet cache in step with a growing VDH CSV."""
+import os
+
+import pandas as pd
+
+from covid_metrics import vdh
+
+HEADER = 'Report Date,FIPS,Locality,VDH Health District,Total Cases,Number of Hospitalizations,Number of Deaths\n'
+LOCALITIES = [(51001 + 2 * i, f'Place {i}') for i in range(10)]
+
+
+def day_rows(day, n=len(LOCALITIES)):
+    date = (pd.Timestamp('2021-03-01') + pd.Timedelta(days=day)).strftime(vdh.DATE_FORMAT)
+    return ''.join(f'{date},{fips},{name},District,{day * 10 + i},0,0\n'
+                   for i, (fips, name) in enumerate(LOCALITIES[:n]))
+
+
+def write(path, text):
+    """Write the CSV, dated after any cache of it so load_cases() reads it."""
+    cache = vdh.cache_path(path)
+    with open(path, 'w') as f:
+        f.write(HEADER + text)
+    if os.path.exists(cache):
+        os.utime(path, (os.path.getmtime(cache) + 10,) * 2)
+
+
+def test_partial_last_day_is_completed(tmp_path):
+    path = str(tmp_path / 'cases.csv')
+    # the last day cached with only 4 of its 10 localities published
+    write(path, day_rows(0) + day_rows(1) + day_rows(2, n=4))
+    assert len(vdh.load_cases(path)) == 24
+
+    write(path, day_rows(0) + day_rows(1) + day_rows(2) + day_rows(3))
+    df = vdh.load_cases(path)
+    assert (df['date'].value_counts() == 10).all()
+
+    full = vdh.load_cases(path, rebuild=True)
+    key = ['date', 'FIPS']
+    pd.testing.assert_frame_equal(df.sort_values(key, ignore_index=True),
+                                  full.sort_values(key, ignore_index=True))
+
+
+def test_unchanged_tail_keeps_the_cache(tmp_path):
+    path = str(tmp_path / 'cases.csv')
+    write(path, day_rows(0) + day_rows(1))
+    vdh.load_cases(path)
+    cache = vdh.cache_path(path)
+    before = open(cache, 'rb').read()
+
+    # a newer CSV with the same rows isn't written back to the cache
+    write(path, day_rows(0) + day_rows(1))
+    assert len(vdh.load_cases(path)) == 20
+    assert open(cache, 'rb').read() == before
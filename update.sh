@@ -4,50 +4,21 @@
 # webdrivermanager chrome 
 # or maybe 
 
-IPY=/Users/drf/anaconda3/envs/py3plot/bin/ipython
+PY=/Users/drf/anaconda3/envs/py3plot/bin/python
 
-for file in *.ipynb; do 
+# every step below is logged to runlog.jsonl as part of this one run
+export COVID_METRICS_RUN="$(date +%Y%m%dT%H%M%S)-$$" COVID_METRICS_SCRIPT=update.sh
 
-if [ "$file" -nt "${file%.ipynb}.py" ] ; then 
-# Save notebook as a python script:
-jupyter nbconvert --to script $file
-fi
+# The .py scripts are edited directly, so they aren't rebuilt from the notebooks
+# with nbconvert any more (that would undo them), and the pipeline below does their work.
 
-done
+# One process does the whole refresh: the VDH data is downloaded, parsed and
+# windowed once, the state map, county maps and York plots render concurrently,
+# then the PNGs are exported.  Maps, plots and PNGs whose data hasn't changed
+# since the last run are skipped (--force redraws them).  Prints the wall time of each stage.
+$PY -m covid_metrics.pipeline
 
-$IPY CovidStates.py 
-$IPY YorkCountyCovidMetric.py 
-$IPY AllCountyCovidMetric.py 
-
-
-$IPY <<EOT
-
-import os,glob
-import time
-from selenium import webdriver
-
-delay=5
-
-def html_to_png(fn):
-    #Save the map as an HTML file
-    #fn='docs/us_covid_states_map.html'
-    #fn.replace('html','png')
-    tmpurl='file://{path}/{mapfile}'.format(path=os.getcwd(),mapfile=fn)
-    fn_png = fn.replace('.html','.png')
-    browser.get(tmpurl)
-    time.sleep(delay)
-    browser.save_screenshot(fn.replace('.html','.png'))
-
-options = webdriver.ChromeOptions()
-options.headless = True
-#browser = webdriver.Chrome('/usr/local/bin/chromedriver',options=options)
-browser = webdriver.Chrome('/Users/drf/Library/Application Support/WebDriverManager/bin/chromedriver',options=options)
-for fn in glob.glob('docs/*map*.html'):
-    html_to_png(fn)
-browser.quit()
-
-
-
-EOT
+# this run's stages against the median of the last few
+$PY -m covid_metrics.runlog summary
 
 echo "Commit & push will update https://github.com/drf5n/YCSD_covid_metrics/"